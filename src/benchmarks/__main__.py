@@ -0,0 +1,43 @@
+from argparse import ArgumentParser
+from os.path import dirname, join
+from platform import python_version
+from orjson import dumps, loads, OPT_INDENT_2, OPT_SORT_KEYS
+from .cases import CASES
+from .runner import benchmark, compare
+
+BASELINE = join(dirname(__file__), 'baseline.json')
+
+def main():
+    parser = ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('cases', nargs='*', default=list(CASES.keys()))
+    parser.add_argument('--size', type=int, default=16*1024*1024, help='approximate size of the generated input in bytes')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed throughput drop before a case counts as regressed')
+    args = parser.parse_args()
+
+    current = {
+        'python': python_version(),
+        'size': args.size,
+        'cases': {name: benchmark(name, args.size, args.repeat) for name in args.cases},
+    }
+
+    if args.save:
+        with open(args.baseline, 'wb') as file:
+            file.write(dumps(current, option=OPT_INDENT_2 | OPT_SORT_KEYS))
+
+    with open(args.baseline, 'rb') as file:
+        baseline = loads(file.read())
+
+    try:
+        regressions = compare(current, baseline, args.tolerance)
+    except ValueError as error:
+        exit(str(error))
+
+    if regressions:
+        print(f'regressed: {", ".join(regressions)}')
+        exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+from orjson import loads
+from binarian import Funnel, BinaryPipe, DictPipe, Ungzip, XmlToJson, NDJsonChunk, NDJsonIndex, QuickSort, MergeSort, DataMarker
+from binarian.engine.common import Metadata, Metrics
+from .data import mediawiki, mediawiki_gzip, ndjson, chunked
+
+CASES = dict()
+
+def case(name):
+    def register(prepare):
+        CASES[name] = prepare
+        return prepare
+    return register
+
+def extract(row):
+    return int(row['id'])
+
+def drain(steps, chunks, prev):
+    funnel = Funnel(steps)
+    funnel.bind(Metrics('benchmark'), Metadata(), prev=prev)
+    funnel.subscribe(lambda: funnel.read(size=-1))
+
+    for chunk in chunks:
+        funnel.append(chunk)
+
+    funnel.flush()
+
+def index(data):
+    funnel = Funnel([NDJsonIndex(extract=extract)])
+    funnel.bind(Metrics('benchmark'), Metadata(), prev=BinaryPipe())
+    funnel.append(data)
+    funnel.flush()
+    return funnel.read(size=-1)
+
+class Replay:
+    def __init__(self):
+        self.input = 'dict'
+        self.output = 'binary'
+
+    def bind(self, prev, next, metrics, metadata):
+        self.prev = prev
+        self.next = next
+        self.prev.subscribe(self.changed)
+
+    def changed(self):
+        while pieces := self.prev.read(size=-1):
+            for piece in pieces:
+                self.next.append(piece)
+
+    def flush(self):
+        self.changed()
+
+class Run:
+    def __init__(self, data):
+        self.data = data
+
+    def split(self, piecesize):
+        pieces, offset = list(), 0
+        while offset < len(self.data):
+            end = self.data.find(b'\n', offset + piecesize)
+            end = len(self.data) if end < 0 else end + 1
+            pieces.append(self.data[offset:end])
+            offset = end
+        return pieces
+
+@case('binary-pipe')
+def binary_pipe(size):
+    chunks = chunked(ndjson(size))
+
+    def run():
+        pipe = BinaryPipe()
+        def changed():
+            while pipe.length() > 1024 * 1024 and (index := pipe.rfind(b'\n')) > -1:
+                pipe.read(size=index+1)
+        pipe.subscribe(changed)
+        for chunk in chunks:
+            pipe.append(chunk)
+        pipe.read(size=-1)
+
+    return sum([len(chunk) for chunk in chunks]), run
+
+@case('dict-pipe')
+def dict_pipe(size):
+    rows = [row.data for row in index(ndjson(size))]
+
+    def run():
+        pipe = DictPipe()
+        def changed():
+            while pipe.read(size=1):
+                pass
+        pipe.subscribe(changed)
+        for row in rows:
+            pipe.append([row])
+
+    return sum([len(row) for row in rows]), run
+
+@case('ungzip')
+def ungzip(size):
+    chunks = chunked(mediawiki_gzip(size))
+    return sum([len(chunk) for chunk in chunks]), lambda: drain([Ungzip()], chunks, BinaryPipe())
+
+@case('xml-to-json')
+def xml_to_json(size):
+    chunks = chunked(mediawiki(size))
+    return sum([len(chunk) for chunk in chunks]), lambda: drain([XmlToJson(rowtag='revision')], chunks, BinaryPipe())
+
+@case('ndjson-chunk')
+def ndjson_chunk(size):
+    chunks = chunked(ndjson(size))
+    return sum([len(chunk) for chunk in chunks]), lambda: drain([NDJsonChunk()], chunks, BinaryPipe())
+
+@case('ndjson-index')
+def ndjson_index(size):
+    chunks = chunked(ndjson(size))
+    return sum([len(chunk) for chunk in chunks]), lambda: drain([NDJsonIndex(extract=extract)], chunks, BinaryPipe())
+
+@case('quick-sort')
+def quick_sort(size):
+    data = ndjson(size)
+    return len(data), lambda: drain([QuickSort(key=lambda row: row.key)], [index(data)], DictPipe())
+
+@case('merge-sort')
+def merge_sort(size, runs=8):
+    rows = sorted([(extract(loads(line)), line + b'\n') for line in ndjson(size).splitlines()], key=lambda row: row[0])
+    data = [Run(b''.join([row[1] for row in rows[number::runs]])) for number in range(runs)]
+    steps = lambda item: [Replay(), NDJsonIndex(extract=extract)]
+    return sum([len(item.data) for item in data]), lambda: drain([MergeSort(piecesize=1024*1024, key=lambda row: row.key, steps=steps)], [data], DictPipe())
+
+@case('data-marker')
+def data_marker(size):
+    data = ndjson(size)
+    rows = sorted(index(data), key=lambda row: row.key)
+    return len(data), lambda: drain([DataMarker(key='sorting:markers', count=16)], [rows], DictPipe())
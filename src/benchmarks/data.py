@@ -0,0 +1,57 @@
+from gzip import compress
+from random import Random
+from orjson import dumps, OPT_APPEND_NEWLINE
+
+WORDS = ['wiki', 'page', 'edit', 'revert', 'link', 'category', 'template', 'citation', 'article', 'talk', 'user', 'bot']
+
+def text(random, count):
+    return ' '.join([random.choice(WORDS) for i in range(count)])
+
+def revision(random, page, index):
+    return {
+        'id': str(page * 1000 + index),
+        'parentid': str(page * 1000 + index - 1),
+        'timestamp': f'20{random.randint(1, 20):02}-{random.randint(1, 12):02}-{random.randint(1, 28):02}T{random.randint(0, 23):02}:{random.randint(0, 59):02}:{random.randint(0, 59):02}Z',
+        'contributor': {'username': f'User{random.randint(1, 100000)}', 'id': str(random.randint(1, 100000))},
+        'comment': text(random, random.randint(0, 12)),
+        'model': 'wikitext',
+        'format': 'text/x-wiki',
+        'text': text(random, random.randint(0, 64)),
+        'sha1': f'{random.getrandbits(160):040x}',
+    }
+
+def element(tag, value):
+    if isinstance(value, dict):
+        return f'<{tag}>{"".join([element(key, item) for key, item in value.items()])}</{tag}>'
+    return f'<{tag}>{value}</{tag}>'
+
+def revisions(size, seed=0):
+    random = Random(seed)
+    page, generated = 0, 0
+    while generated < size:
+        page += 1
+        for index in range(random.randint(1, 8)):
+            row = revision(random, page, index)
+            generated += len(row['text']) + len(row['comment']) + 256
+            yield page, row
+
+def mediawiki(size, seed=0):
+    chunks = ['<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" version="0.10"><siteinfo><sitename>Wikipedia</sitename></siteinfo>']
+    current = None
+    for page, row in revisions(size, seed):
+        if current != page:
+            chunks.append('</page>' if current is not None else '')
+            chunks.append(f'<page><title>Page {page}</title><ns>0</ns><id>{page}</id>')
+            current = page
+        chunks.append(element('revision', row))
+    chunks.append('</page></mediawiki>')
+    return ''.join(chunks).encode('utf-8')
+
+def mediawiki_gzip(size, seed=0):
+    return compress(mediawiki(size, seed), compresslevel=6)
+
+def ndjson(size, seed=0):
+    return b''.join([dumps(row, option=OPT_APPEND_NEWLINE) for page, row in revisions(size, seed)])
+
+def chunked(data, chunksize=128*1024):
+    return [data[index:index+chunksize] for index in range(0, len(data), chunksize)]
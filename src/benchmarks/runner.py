@@ -0,0 +1,78 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from resource import getrusage, RUSAGE_SELF
+from time import perf_counter
+from .cases import CASES
+
+def reset_peak():
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+def status(field):
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith(f'{field}:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def measure(name, size):
+    processed, run = CASES[name](size)
+    before = status('VmRSS') if reset_peak() else None
+    started = perf_counter()
+    run()
+    elapsed = perf_counter() - started
+    peak = status('VmHWM')
+
+    return {
+        'seconds': elapsed,
+        'bytes': processed,
+        'rss_before_mb': before / 1024 if before is not None and peak is not None else None,
+        'rss_peak_mb': (peak if peak is not None else getrusage(RUSAGE_SELF).ru_maxrss) / 1024,
+    }
+
+def growth(results):
+    if any([result['rss_before_mb'] is None for result in results]):
+        return None
+    return max([result['rss_peak_mb'] - result['rss_before_mb'] for result in results])
+
+def benchmark(name, size, repeat):
+    results = list()
+    for iteration in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            results.append(executor.submit(measure, name, size).result())
+
+    best = min(results, key=lambda result: result['seconds'])
+    return {
+        'seconds': best['seconds'],
+        'mb_per_second': best['bytes'] / best['seconds'] / 1024 / 1024,
+        'peak_rss_mb': max([result['rss_peak_mb'] for result in results]),
+        'growth_rss_mb': growth(results),
+    }
+
+def compare(current, baseline, tolerance):
+    if baseline.get('size') != current['size']:
+        raise ValueError(f'baseline was recorded with --size {baseline.get("size")}, this run used --size {current["size"]}')
+
+    regressions = list()
+    print(f'{"case":<14} {"MB/s":>10} {"base":>10} {"delta":>8} {"RSS MB":>8} {"base":>8}')
+
+    for name, result in current['cases'].items():
+        reference = baseline['cases'].get(name)
+        if reference is None:
+            print(f'{name:<14} {result["mb_per_second"]:>10.2f} {"-":>10} {"-":>8} {result["peak_rss_mb"]:>8.1f} {"-":>8}')
+            continue
+
+        delta = result['mb_per_second'] / reference['mb_per_second'] - 1
+        print(f'{name:<14} {result["mb_per_second"]:>10.2f} {reference["mb_per_second"]:>10.2f} {delta:>+8.1%} {result["peak_rss_mb"]:>8.1f} {reference["peak_rss_mb"]:>8.1f}')
+
+        if delta < -tolerance:
+            regressions.append(name)
+
+    return regressions
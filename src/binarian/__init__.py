@@ -1,9 +1,9 @@
 __author__ = """Adrian Macal"""
 
-from .engine import Funnel, Pipeline, BinaryPipe, DictPipe
-from .common import Singleton, OneToMany, OneToOne, Conditional, AcquireToken, ReleaseToken, ForEachChunk, ForEachItem, ForEachItemParallel, QuickSort, MergeSort, DataMarker, MergeGroup, MinMax, DictDebug, BinaryDebug, WaitAll, DictConsumer, BinaryConsumer, Serialize, Deserialize
+from .engine import Funnel, Pipeline, Stage, BinaryPipe, DictPipe, AsyncFunnel, AsyncPipeline
+from .common import Singleton, OneToMany, OneToOne, Conditional, AcquireToken, ReleaseToken, ForEachChunk, ForEachItem, ForEachItemParallel, QuickSort, MergeSort, DataMarker, MergeGroup, MinMax, DictDebug, BinaryDebug, WaitAll, DictConsumer, BinaryConsumer, Serialize, Deserialize, Offload, Tee, AsyncConditional, AsyncAcquireToken, AsyncReleaseToken
 
-from .amazon import S3Prefix, S3Object, S3List, S3Delete, S3Download, S3Upload, S3Rename, S3Chunk, S3KeyExists, EcsTask, Lambda
+from .amazon import S3Prefix, S3Object, S3ObjectChunk, S3List, S3Delete, S3Download, S3Upload, S3Rename, S3Chunk, S3KeyExists, EcsTask, Lambda, AsyncS3Download, AsyncS3Upload, AsyncS3KeyExists, AsyncLambda, AsyncEcsTask
 from .formats import XmlToJson, NDJsonChunk, NDJsonIndex, NDJsonFlush, NDJsonMeasure
 
 from .compress import Ungzip
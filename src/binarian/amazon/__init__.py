@@ -1,3 +1,4 @@
 from .ecs import EcsTask
 from .lmbd import Lambda
-from .s3 import S3Prefix, S3Object, S3List, S3Delete, S3Download, S3Upload, S3Rename, S3Chunk, S3KeyExists
+from .s3 import S3Prefix, S3Object, S3ObjectChunk, S3List, S3Delete, S3Download, S3Upload, S3Rename, S3Chunk, S3KeyExists
+from .asynchronous import AsyncS3Download, AsyncS3Upload, AsyncS3KeyExists, AsyncLambda, AsyncEcsTask
@@ -0,0 +1,184 @@
+from asyncio import FIRST_COMPLETED, create_task, gather, sleep, wait
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from ..engine.asynchronous import blocking
+from .ecs import EcsTask, ecs, logs
+from .lmbd import Lambda
+from .ranges import range_cache
+from .s3 import S3Download, S3Upload, S3KeyExists, MAXIMUM_PARTS
+
+def executor(step):
+    if getattr(step, 'executor', None) is None:
+        step.executor = ThreadPoolExecutor(max_workers=max(1, getattr(step, 'concurrency', 1)))
+    return step.executor
+
+def shutdown(step):
+    if getattr(step, 'executor', None) is not None:
+        step.executor.shutdown(wait=True)
+        step.executor = None
+
+async def run(step, function, *args):
+    return await blocking(function, *args, executor=executor(step))
+
+async def call(step, function, **kwargs):
+    return await run(step, partial(function, **kwargs))
+
+class AsyncS3Download(S3Download):
+    async def changed(self):
+        for target in self.prev.items():
+            await self.download(target)
+
+    async def download(self, target):
+        offset = 0 if not hasattr(target, 'start') else target.start
+        size = await run(self, self.measure, target) if not hasattr(target, 'end') else target.end + 1
+
+        while offset < size:
+            offset += await self.range(target, offset, size)
+
+    async def range(self, target, offset, total):
+        available = min(total - offset, self.chunksize) - 1
+        self.metrics.log(f'downloading range {offset}:{offset+available}')
+
+        if self.cache:
+            segments = range_cache.read(self.client, target.bucket, target.key, offset, offset+available, self.cache != 'read')
+            while (segment := await run(self, next, segments, None)) is not None:
+                await self.next.append(segment)
+            return available + 1
+
+        response = await call(self, self.client.get_object,
+            Range=f'bytes={offset}-{offset+available}',
+            Bucket=target.bucket,
+            Key=target.key
+        )
+
+        while chunk := await run(self, response['Body'].read, 128 * 1024):
+            await self.next.append(chunk)
+
+        return available + 1
+
+    async def flush(self):
+        shutdown(self)
+
+class AsyncS3Upload(S3Upload):
+    async def start_upload(self):
+        if not self.upload_id:
+            self.key = self.keyer(self.metadata)
+            self.upload_id = (await call(self, self.client.create_multipart_upload, Bucket=self.bucket, Key=self.key))['UploadId']
+            self.metrics.log(f'upload started {self.key}')
+
+    async def changed(self):
+        self.stage()
+        await self.upload(size=self.threshold())
+
+    async def flush(self):
+        try:
+            self.stage()
+            await self.upload(size=self.threshold())
+            if not self.upload_id:
+                await self.put()
+            else:
+                await self.upload()
+                await self.settle(0, 0)
+                await self.complete()
+        finally:
+            shutdown(self)
+
+    async def upload(self, size=0):
+        while self.available() > size:
+            if self.part > MAXIMUM_PARTS:
+                raise ValueError(f'upload {self.key} exceeds {MAXIMUM_PARTS} parts')
+            await self.start_upload()
+            body, length = self.take(self.current())
+            self.total += length
+            await self.settle(self.concurrency - 1, self.budget(length))
+            self.pending[create_task(run(self, self.send, self.part, body, length))] = length
+            self.part += 1
+
+    async def settle(self, count, size):
+        while len(self.pending) > count or size is not None and len(self.pending) > 0 and sum(self.pending.values()) > size:
+            done, _ = await wait(self.pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                del self.pending[future]
+                await self.receive(future)
+
+    async def receive(self, future):
+        try:
+            part, etag = future.result()
+            self.parts[part] = etag
+        except BaseException:
+            await self.abort()
+            raise
+
+    async def put(self):
+        self.key = self.keyer(self.metadata)
+        body, self.total = self.take(-1)
+        response = await run(self, self.store, body, self.total)
+        self.metrics.log(f'upload completed {self.key}')
+        await self.next.append([self.uploaded(response.get('ETag'))])
+
+    async def abort(self):
+        await gather(*self.pending, return_exceptions=True)
+        self.pending.clear()
+        await call(self, self.client.abort_multipart_upload, Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        self.metrics.log(f'upload aborted {self.key}')
+        shutdown(self)
+
+    async def complete(self):
+        parts = [{'ETag': self.parts[part], 'PartNumber': part} for part in sorted(self.parts)]
+        response = await call(self, self.client.complete_multipart_upload, Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={'Parts': parts})
+        self.metrics.log(f'upload completed {self.key}')
+        await self.next.append([self.uploaded(response.get('ETag'))])
+
+class AsyncS3KeyExists(S3KeyExists):
+    async def evaluate(self, value):
+        return await run(self, super().evaluate, value)
+
+class AsyncLambda(Lambda):
+    async def changed(self):
+        while objects := self.prev.read(size=-1):
+            for item in objects:
+                if (data := await run(self, self.start, item)) is not None:
+                    await self.next.append([data])
+
+    async def flush(self):
+        await self.changed()
+        shutdown(self)
+
+class AsyncEcsTask(EcsTask):
+    async def changed(self):
+        for item in self.prev.items():
+            await self.wait(*await run(self, self.start, item))
+            await self.next.append([item])
+
+    async def flush(self):
+        shutdown(self)
+
+    async def wait(self, taskArn, logOptions):
+        self.metrics.log(f'waiting {taskArn}')
+
+        stoppedAt = None
+        logArgs = {
+            'startFromHead': True,
+            'logGroupName': logOptions['awslogs-group'],
+            'logStreamName': '/'.join([logOptions['awslogs-stream-prefix']]+taskArn.split('/')[-2:])
+        }
+
+        while not stoppedAt:
+            response = await call(self, ecs.describe_tasks,
+                cluster=self.cluster,
+                tasks=[taskArn],
+            )
+
+            if 'stoppedAt' in response['tasks'][0]:
+                stoppedAt = response['tasks'][0]['stoppedAt']
+
+            try:
+                response = await call(self, logs.get_log_events, **logArgs)
+                logArgs['nextToken'] = response['nextForwardToken']
+
+                for event in response['events']:
+                    self.metrics.raw(event['message'])
+            except logs.exceptions.ResourceNotFoundException:
+                pass
+
+            await sleep(1)
@@ -0,0 +1,53 @@
+from collections import OrderedDict
+from os import getenv
+from threading import Lock
+from time import monotonic
+from botocore.exceptions import ClientError
+
+class ObjectCache:
+    def __init__(self, capacity=65536, ttl=300):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, bucket, key):
+        with self.lock:
+            entry = self.entries.get((bucket, key))
+            if entry is None or entry[0] < monotonic():
+                self.entries.pop((bucket, key), None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end((bucket, key))
+            self.hits += 1
+            return entry[1]
+
+    def put(self, bucket, key, total, etag=None):
+        with self.lock:
+            self.entries[(bucket, key)] = (monotonic() + self.ttl, (total, etag))
+            self.entries.move_to_end((bucket, key))
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def forget(self, bucket, key):
+        with self.lock:
+            self.entries.pop((bucket, key), None)
+
+    def head(self, client, bucket, key):
+        if (value := self.get(bucket, key)) is not None:
+            return value
+
+        try:
+            response = client.head_object(Bucket=bucket, Key=key)
+        except ClientError as ex:
+            if ex.response['Error']['Code'] != '404':
+                raise
+            return (None, None)
+
+        value = (response['ContentLength'], response.get('ETag'))
+        self.put(bucket, key, *value)
+        return value
+
+object_cache = ObjectCache(capacity=int(getenv('BINARIAN_S3_CACHE_SIZE', '65536')), ttl=float(getenv('BINARIAN_S3_CACHE_TTL', '300')))
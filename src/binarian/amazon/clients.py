@@ -0,0 +1,51 @@
+from threading import Lock
+from boto3.session import Session
+from botocore.config import Config
+
+DEFAULT_CONNECTIONS = 32
+
+class ClientRegistry:
+    def __init__(self):
+        self.lock = Lock()
+        self.session = None
+        self.clients = dict()
+
+    def get(self, key, service, options, connections):
+        entry = self.clients.get(key)
+        if entry is not None and entry[0] >= connections:
+            return entry[1]
+
+        with self.lock:
+            entry = self.clients.get(key)
+            if entry is None or entry[0] < connections:
+                size = max(DEFAULT_CONNECTIONS, connections, 0 if entry is None else entry[0])
+                self.session = Session() if self.session is None else self.session
+                entry = (size, self.session.client(service, config=Config(max_pool_connections=size, **options)))
+                self.clients[key] = entry
+
+        return entry[1]
+
+    def clear(self):
+        with self.lock:
+            self.clients.clear()
+            self.session = None
+
+registry = ClientRegistry()
+
+class LazyClient:
+    def __init__(self, service, connections=0, **options):
+        self.service = service
+        self.connections = connections
+        self.options = options
+        self.key = (service, repr(sorted(options.items())))
+
+    def resolve(self):
+        return registry.get(self.key, self.service, self.options, self.connections)
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name in ('service', 'connections', 'options', 'key'):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+def client(service, connections=0, **options):
+    return LazyClient(service, connections, **options)
@@ -1,16 +1,13 @@
 from time import sleep
-from boto3 import client
-from botocore.config import Config
+from .clients import client
 
-config = Config(
-   retries = {
-      'max_attempts': 10,
-      'mode': 'adaptive'
-   }
-)
+retries = {
+   'max_attempts': 10,
+   'mode': 'adaptive'
+}
 
-ecs = client('ecs', config=config)
-logs = client('logs', config=config)
+ecs = client('ecs', retries=retries)
+logs = client('logs', retries=retries)
 
 class EcsTask:
     def __init__(self, cluster, task, securityGroup, vpcSubnet, environment):
@@ -29,10 +26,9 @@ class EcsTask:
         self.prev.subscribe(self.changed)
 
     def changed(self):
-        while items := self.prev.read(size=1):
-            for item in items:
-                self.wait(*self.start(item))
-                self.next.append([item])
+        for item in self.prev.items():
+            self.wait(*self.start(item))
+            self.next.append([item])
 
     def flush(self):
         pass
@@ -1,11 +1,11 @@
 from orjson import dumps, loads
-from boto3 import client
-from botocore.config import Config
+from .clients import client
 
 class Lambda:
     def __init__(self, function, parameters):
         self.function = function
         self.parameters = parameters
+        self.client = client('lambda', connect_timeout=30, read_timeout=900)
         self.input = 'dict'
         self.output = 'dict'
 
@@ -18,7 +18,8 @@ class Lambda:
     def changed(self):
         while objects := self.prev.read(size=-1):
             for item in objects:
-                self.start(item)
+                if (data := self.start(item)) is not None:
+                    self.next.append([data])
 
     def flush(self):
         self.changed()
@@ -26,8 +27,7 @@ class Lambda:
     def start(self, item):
         self.metrics.log('calling lambda function ...')
 
-        config = Config(connect_timeout=30, read_timeout=900)
-        response = client('lambda', config=config).invoke(
+        response = self.client.invoke(
             FunctionName=self.function,
             InvocationType='RequestResponse',
             Payload=dumps(self.parameters(item))
@@ -41,6 +41,6 @@ class Lambda:
             raise data
 
         if int(response["StatusCode"]) == 200:
-            self.next.append([data])
-        else:
-            self.metrics.log(data, response)
+            return data
+
+        self.metrics.log(data, response)
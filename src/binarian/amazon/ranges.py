@@ -0,0 +1,103 @@
+from collections import OrderedDict
+from mmap import mmap
+from os import getenv
+from tempfile import TemporaryFile
+from threading import Lock
+from .cache import object_cache
+
+class RangeCache:
+    def __init__(self, blocksize=64*1024, memory=64*1024*1024, disk=256*1024*1024, directory=None):
+        self.blocksize = blocksize
+        self.memory = memory
+        self.disk = disk
+        self.directory = directory
+        self.lock = Lock()
+        self.blocks = OrderedDict()
+        self.stored = 0
+        self.slots = OrderedDict()
+        self.free = list(range(disk // blocksize))
+        self.mapped = None
+        self.hits = 0
+        self.misses = 0
+
+    def map(self):
+        if self.mapped is None:
+            file = TemporaryFile(dir=self.directory)
+            file.truncate(self.disk // self.blocksize * self.blocksize)
+            self.mapped = mmap(file.fileno(), self.disk // self.blocksize * self.blocksize)
+            file.close()
+        return self.mapped
+
+    def get(self, block):
+        with self.lock:
+            if (data := self.blocks.get(block)) is not None:
+                self.blocks.move_to_end(block)
+                return data
+            if (entry := self.slots.get(block)) is not None:
+                self.slots.move_to_end(block)
+                return self.mapped[entry[0]*self.blocksize:entry[0]*self.blocksize+entry[1]]
+
+    def put(self, block, data):
+        with self.lock:
+            if block in self.blocks or block in self.slots:
+                return
+            self.blocks[block] = data
+            self.stored += len(data)
+            while self.stored > self.memory:
+                evicted, value = self.blocks.popitem(last=False)
+                self.stored -= len(value)
+                self.spill(evicted, value)
+
+    def spill(self, block, data):
+        if len(self.free) == 0 and len(self.slots) > 0:
+            self.free.append(self.slots.popitem(last=False)[1][0])
+        if len(self.free) > 0:
+            slot = self.free.pop()
+            self.map()[slot*self.blocksize:slot*self.blocksize+len(data)] = data
+            self.slots[block] = (slot, len(data))
+
+    def fetch(self, client, bucket, key, tag, first, last, start, end, store):
+        if not store:
+            lower, upper = max(start, first * self.blocksize), min(end, (last + 1) * self.blocksize - 1)
+            body = client.get_object(Bucket=bucket, Key=key, Range=f'bytes={lower}-{upper}')['Body']
+            while chunk := body.read(128 * 1024):
+                yield chunk
+            return
+
+        body = client.get_object(Bucket=bucket, Key=key, Range=f'bytes={first*self.blocksize}-{(last+1)*self.blocksize-1}')['Body']
+        for index in range(first, last + 1):
+            data = body.read(self.blocksize)
+            while len(data) < self.blocksize and (chunk := body.read(self.blocksize - len(data))):
+                data += chunk
+            if len(data) > 0:
+                self.put((bucket, key, tag, index), data)
+                yield self.trim(index, data, start, end)
+
+    def trim(self, index, data, start, end):
+        lower = max(start - index * self.blocksize, 0)
+        upper = min(end + 1 - index * self.blocksize, self.blocksize)
+        return data if lower == 0 and upper >= len(data) else data[lower:upper]
+
+    def read(self, client, bucket, key, start, end, store=True):
+        total, tag = object_cache.head(client, bucket, key)
+        end = end if total is None else min(end, total - 1)
+        first, last = start // self.blocksize, end // self.blocksize
+        blocks = {index: self.get((bucket, key, tag, index)) for index in range(first, last + 1)}
+
+        missing = [index for index, data in blocks.items() if data is None]
+        self.hits += len(blocks) - len(missing)
+        self.misses += len(missing)
+
+        index = first
+        while index <= last:
+            if blocks[index] is not None:
+                yield self.trim(index, blocks[index], start, end)
+                index += 1
+            else:
+                run = index
+                while run < last and blocks[run + 1] is None:
+                    run += 1
+                yield from self.fetch(client, bucket, key, tag, index, run, start, end, store)
+                index = run + 1
+
+range_cache = RangeCache(memory=int(getenv('BINARIAN_RANGE_CACHE_MEMORY', str(64*1024*1024))), disk=int(getenv('BINARIAN_RANGE_CACHE_DISK', str(256*1024*1024))), directory=getenv('BINARIAN_RANGE_CACHE_DIR'))
@@ -1,9 +1,66 @@
+from collections import deque
+from io import BytesIO
+from itertools import groupby
+from os import getenv
+from queue import Queue
+from tempfile import TemporaryFile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from time import sleep
-from boto3 import client
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
+from .clients import client
+from .cache import object_cache
+from .ranges import range_cache
+
+MINIMUM_PART_SIZE = 5 * 1024 * 1024
+MAXIMUM_PARTS = 10000
+PART_GROWTH = 16
 
 def measure_object(client, bucket, key):
-    return client.head_object(Bucket=bucket, Key=key)['ContentLength']
+    if (total := object_cache.head(client, bucket, key)[0]) is None:
+        raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+    return total
+
+def find_delimiter(client, target, offset, delimiter=b'\n', probesize=64*1024, cache=None):
+    while offset < target.total:
+        if cache is None:
+            end = min(offset + probesize, target.total) - 1
+            data = client.get_object(Bucket=target.bucket, Key=target.key, Range=f'bytes={offset}-{end}')['Body'].read()
+        else:
+            end = min(max(offset + 1, (offset + probesize) // cache.blocksize * cache.blocksize), target.total) - 1
+            data = b''.join(cache.read(client, target.bucket, target.key, offset, end))
+        if (index := data.find(delimiter)) > -1:
+            return offset + index + len(delimiter) - 1
+        offset = end - len(delimiter) + 2 if len(delimiter) > 1 else end + 1
+        probesize *= 2
+    return target.total - 1
+
+def align_ranges(client, ranges, delimiter=b'\n', probesize=64*1024, concurrency=8):
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(ranges) - 1))) as executor:
+        ends = list(executor.map(lambda item: find_delimiter(client, item, item.end, delimiter, probesize), ranges[:-1])) + [ranges[-1].end]
+    starts = [ranges[0].start] + [end + 1 for end in ends[:-1]]
+    return [S3ObjectRange(item.bucket, item.key, item.total, start, end) for item, start, end in zip(ranges, starts, ends) if start <= end]
+
+def delete_batch(client, bucket, keys, retries=3):
+    for attempt in range(retries + 1):
+        response = client.delete_objects(Bucket=bucket, Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True})
+        if not (errors := response.get('Errors', list())):
+            return
+        keys = [error['Key'] for error in errors]
+        sleep(2 ** attempt) if attempt < retries else None
+    raise ClientError({'Error': {'Code': errors[0]['Code'], 'Message': f'{len(keys)} keys not deleted from {bucket}, including {keys[0]}'}}, 'DeleteObjects')
+
+def delete_objects(client, items, concurrency=1, retries=3):
+    batches = list()
+    for bucket, entries in groupby(sorted((item.bucket, item.key) for item in items), key=lambda entry: entry[0]):
+        keys = [key for _, key in entries]
+        batches.extend((bucket, keys[index:index+1000]) for index in range(0, len(keys), 1000))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as executor:
+        for future in [executor.submit(delete_batch, client, bucket, keys, retries) for bucket, keys in batches]:
+            future.result()
+
+    for item in items:
+        object_cache.forget(item.bucket, item.key)
 
 class S3Prefix(object):
     def __init__(self, bucket, prefix):
@@ -11,14 +68,25 @@ class S3Prefix(object):
         self.prefix = prefix
 
 class S3Object(object):
-    def __init__(self, bucket, key):
+    def __init__(self, bucket, key, total=None, etag=None):
         self.bucket = bucket
         self.key = key
+        if total is not None:
+            self.total = total
+        if etag is not None:
+            self.etag = etag
 
     def ensure_measured(self):
         if not hasattr(self, 'total'):
             self.total = measure_object(client('s3'), self.bucket, self.key)
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if hasattr(self, 'total'):
+            object_cache.put(self.bucket, self.key, self.total, getattr(self, 'etag', None))
+        elif (value := object_cache.get(self.bucket, self.key)) is not None and value[0] is not None:
+            self.total = value[0]
+
     def range(self, index, size, total):
         return S3ObjectRange(self.bucket, self.key, total, index, min(index + size, total) - 1)
 
@@ -54,12 +122,26 @@ class S3ObjectRange(object):
     def __str__(self):
         return f's3://{self.bucket}/{self.key} range {self.start}:{self.end}/{self.total}'
 
+class S3ObjectChunk(object):
+    def __init__(self, bucket, key, offset, data):
+        self.bucket = bucket
+        self.key = key
+        self.offset = offset
+        self.data = data
+
+    def __str__(self):
+        return f's3://{self.bucket}/{self.key} chunk {self.offset}:{self.offset+len(self.data)-1}'
+
 class S3Download:
-    def __init__(self, chunksize=32*1024*1024):
-        self.client = client('s3')
+    def __init__(self, chunksize=32*1024*1024, concurrency=1, buffersize=None, ordered=True, cache=False):
+        self.client = client('s3', connections=concurrency)
         self.chunksize = chunksize
+        self.concurrency = concurrency
+        self.buffersize = buffersize
+        self.ordered = ordered
+        self.cache = cache
         self.input = 'dict'
-        self.output = 'binary'
+        self.output = 'binary' if ordered else 'dict'
 
     def length(self):
         return None
@@ -71,12 +153,11 @@ class S3Download:
         self.prev.subscribe(self.changed)
 
     def changed(self):
-        while objects := self.prev.read(size=1):
-            for target in objects:
-                self.download(target)
+        for target in self.prev.items():
+            self.download(target)
 
     def measure(self, target):
-        size = measure_object(self.client, target.bucket, target.key)
+        size = target.total if hasattr(target, 'total') else measure_object(self.client, target.bucket, target.key)
         self.metrics.log(f'downloading {target} measured as {size} bytes')
         return size
 
@@ -84,13 +165,71 @@ class S3Download:
         offset = 0 if not hasattr(target, 'start') else target.start
         size = self.measure(target) if not hasattr(target, 'end') else target.end + 1
 
-        while offset < size:
-            offset += self.range(target, offset, size)
+        if self.concurrency == 1 and self.ordered:
+            while offset < size:
+                offset += self.range(target, offset, size)
+        else:
+            self.parallel(target, [(index, min(index + self.chunksize, size) - 1) for index in range(offset, size, self.chunksize)])
+
+    def inflight(self):
+        return self.concurrency if self.buffersize is None else max(1, min(self.concurrency, self.buffersize // self.chunksize))
+
+    def fetch(self, target, start, end):
+        self.metrics.log(f'downloading range {start}:{end}')
+        if self.cache:
+            return start, list(range_cache.read(self.client, target.bucket, target.key, start, end, self.cache != 'read'))
+
+        response = self.client.get_object(
+            Range=f'bytes={start}-{end}',
+            Bucket=target.bucket,
+            Key=target.key
+        )
+
+        return start, [response['Body'].read()]
+
+    def emit(self, target, future):
+        offset, segments = future.result()
+        for data in segments:
+            if self.ordered:
+                self.next.append(data)
+            else:
+                self.next.append([S3ObjectChunk(target.bucket, target.key, offset, data)])
+            offset += len(data)
+
+    def parallel(self, target, ranges):
+        limit = self.inflight()
+        pending = deque() if self.ordered else set()
+
+        with ThreadPoolExecutor(max_workers=limit) as executor:
+            for start, end in ranges:
+                if self.ordered:
+                    pending.append(executor.submit(self.fetch, target, start, end))
+                    while len(pending) >= limit:
+                        self.emit(target, pending.popleft())
+                else:
+                    pending.add(executor.submit(self.fetch, target, start, end))
+                    while len(pending) >= limit:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self.emit(target, future)
+
+            while len(pending) > 0:
+                if self.ordered:
+                    self.emit(target, pending.popleft())
+                else:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.emit(target, future)
 
     def range(self, target, offset, total):
         available = min(total - offset, self.chunksize) - 1
         self.metrics.log(f'downloading range {offset}:{offset+available}')
 
+        if self.cache:
+            for segment in range_cache.read(self.client, target.bucket, target.key, offset, offset+available, self.cache != 'read'):
+                self.next.append(segment)
+            return available + 1
+
         response = self.client.get_object(
             Range=f'bytes={offset}-{offset+available}',
             Bucket=target.bucket,
@@ -106,12 +245,22 @@ class S3Download:
         pass
 
 class S3Upload:
-    def __init__(self, bucket, key, chunksize):
+    def __init__(self, bucket, key, chunksize, partsize=MINIMUM_PART_SIZE, concurrency=1, buffersize=None, retries=3, spill=False, directory=None):
         self.chunksize = chunksize
-        self.client = client('s3')
+        self.partsize = partsize
+        self.concurrency = concurrency
+        self.buffersize = buffersize
+        self.retries = retries
+        self.spill = spill
+        self.directory = directory if directory is not None else getenv('BINARIAN_SPILL_DIR')
+        self.client = client('s3', connections=concurrency)
         self.bucket = bucket
         self.part = 1
-        self.parts = list()
+        self.total = 0
+        self.parts = dict()
+        self.pending = dict()
+        self.staged = None
+        self.executor = None
         self.upload_id = None
         self.init_key(key)
         self.input = 'binary'
@@ -129,63 +278,227 @@ class S3Upload:
         self.next = next
         self.metrics = metrics
         self.metadata = metadata
+        self.spill = self.spill or self.prev.bounded(MINIMUM_PART_SIZE) < MINIMUM_PART_SIZE
         self.prev.subscribe(self.changed)
 
     def start_upload(self):
         if not self.upload_id:
             self.key = self.keyer(self.metadata)
             self.upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key)['UploadId']
-            self.metrics.log(f'upload started {self.key}')            
+            self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+            self.metrics.log(f'upload started {self.key}')
 
     def changed(self):
-        self.start_upload()
-        self.upload(size=self.chunksize)
+        self.stage()
+        self.upload(size=self.threshold())
 
     def flush(self):
-        self.start_upload()
-        self.upload()
-        self.complete()
+        self.stage()
+        self.upload(size=self.threshold())
+        if not self.upload_id:
+            self.put()
+        else:
+            self.upload()
+            self.settle(0, 0)
+            self.complete()
+
+    def current(self):
+        return max(MINIMUM_PART_SIZE, min(self.chunksize, self.partsize << ((self.part - 1) // PART_GROWTH)))
+
+    def threshold(self):
+        return self.current() if self.spill else self.prev.bounded(self.current())
+
+    def stage(self):
+        if self.spill and self.prev.length() > 0:
+            self.staged = TemporaryFile(dir=self.directory) if self.staged is None else self.staged
+            for view in self.prev.read_views(-1):
+                self.staged.write(view)
+
+    def available(self):
+        return self.prev.length() if not self.spill else 0 if self.staged is None else self.staged.tell()
+
+    def take(self, size):
+        if not self.spill:
+            chunk = self.prev.read(size)
+            return chunk, len(chunk)
+        body, self.staged = self.staged or BytesIO(), None
+        return body, body.tell()
 
     def upload(self, size=0):
-        while self.prev.length() > size:
-            chunk = self.prev.read(self.chunksize)
-            self.metrics.log(f'part {self.part} started; {len(chunk)} bytes')
-            response = self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=self.part, Body=chunk)
-            self.metrics.log(f'part {self.part} completed; {len(chunk)} bytes')
-            self.parts.append({'ETag': response['ETag'], 'PartNumber': self.part})
+        while self.available() > size:
+            if self.part > MAXIMUM_PARTS:
+                raise ValueError(f'upload {self.key} exceeds {MAXIMUM_PARTS} parts')
+            self.start_upload()
+            body, length = self.take(self.current())
+            self.total += length
+            self.settle(self.concurrency - 1, self.budget(length))
+            self.pending[self.executor.submit(self.send, self.part, body, length)] = length
             self.part += 1
 
+    def budget(self, size):
+        return None if self.buffersize is None else max(0, self.buffersize - size)
+
+    def settle(self, count, size):
+        while len(self.pending) > count or size is not None and len(self.pending) > 0 and sum(self.pending.values()) > size:
+            done, _ = wait(self.pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                del self.pending[future]
+                self.receive(future)
+
+    def receive(self, future):
+        try:
+            part, etag = future.result()
+            self.parts[part] = etag
+        except BaseException:
+            self.abort()
+            raise
+
+    def rewind(self, body):
+        body.seek(0) if hasattr(body, 'seek') else None
+        return body
+
+    def retry(self, label, length, function):
+        for attempt in range(self.retries + 1):
+            try:
+                self.metrics.log(f'{label} started; {length} bytes')
+                response = function()
+                self.metrics.log(f'{label} completed; {length} bytes')
+                return response
+            except (ClientError, BotoCoreError) as ex:
+                if attempt == self.retries:
+                    raise
+                self.metrics.log(f'{label} failed; retrying {ex}')
+                sleep(2 ** attempt)
+
+    def send(self, part, body, length):
+        try:
+            response = self.retry(f'part {part}', length, lambda: self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=part, Body=self.rewind(body)))
+            return part, response['ETag']
+        finally:
+            body.close() if hasattr(body, 'close') else None
+
+    def store(self, body, length):
+        try:
+            return self.retry(f'object {self.key}', length, lambda: self.client.put_object(Bucket=self.bucket, Key=self.key, Body=self.rewind(body)))
+        finally:
+            body.close() if hasattr(body, 'close') else None
+
+    def put(self):
+        self.key = self.keyer(self.metadata)
+        body, self.total = self.take(-1)
+        response = self.store(body, self.total)
+        self.metrics.log(f'upload completed {self.key}')
+        self.next.append([self.uploaded(response.get('ETag'))])
+
+    def uploaded(self, etag):
+        object_cache.put(self.bucket, self.key, self.total, etag)
+        return S3Object(self.bucket, self.key, total=self.total, etag=etag)
+
+    def abort(self):
+        for future in self.pending:
+            future.cancel()
+        self.executor.shutdown(wait=True)
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        self.metrics.log(f'upload aborted {self.key}')
+
     def complete(self):
-        self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={'Parts': self.parts})
+        self.executor.shutdown(wait=True)
+        parts = [{'ETag': self.parts[part], 'PartNumber': part} for part in sorted(self.parts)]
+        response = self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={'Parts': parts})
         self.metrics.log(f'upload completed {self.key}')
-        self.next.append([S3Object(self.bucket, self.key)])
+        self.next.append([self.uploaded(response.get('ETag'))])
 
 class S3List:
-    def __init__(self):
-        self.client = client('s3')
+    def __init__(self, delimiter=None, boundaries=None, concurrency=1):
+        self.client = client('s3', connections=concurrency)
+        self.delimiter = delimiter
+        self.boundaries = boundaries
+        self.concurrency = concurrency
         self.input = 'dict'
         self.output = 'dict'
 
     def bind(self, prev, next, metrics, metadata):
         self.prev = prev
         self.next = next
+        self.metrics = metrics
         self.prev.subscribe(self.changed)
 
+    def pages(self, bucket, prefix, start=None, end=None, delimiter=None):
+        arguments = dict(Bucket=bucket, Prefix=prefix)
+        arguments.update(StartAfter=start) if start is not None else None
+        arguments.update(Delimiter=delimiter) if delimiter is not None else None
+
+        for page in self.client.get_paginator('list_objects_v2').paginate(**arguments):
+            contents = page.get('Contents', list())
+            selected = [content for content in contents if end is None or content['Key'] <= end]
+            yield selected, [common['Prefix'] for common in page.get('CommonPrefixes', list())]
+            if len(selected) < len(contents):
+                break
+
+    def emit(self, bucket, contents):
+        for content in contents:
+            object_cache.put(bucket, content['Key'], content['Size'], content['ETag'])
+        if len(contents) > 0:
+            self.next.append([S3Object(bucket, content['Key'], total=content['Size'], etag=content['ETag']) for content in contents])
+
+    def shards(self, item):
+        if self.delimiter is not None:
+            prefixes = list()
+            for contents, commons in self.pages(item.bucket, item.prefix, delimiter=self.delimiter):
+                self.emit(item.bucket, contents)
+                prefixes.extend(commons)
+            return [(prefix, None, None) for prefix in prefixes]
+
+        if self.boundaries is not None:
+            edges = [None] + [item.prefix + boundary for boundary in self.boundaries] + [None]
+            return [(item.prefix, start, end) for start, end in zip(edges, edges[1:])]
+
+        return [(item.prefix, None, None)]
+
+    def collect(self, queue, bucket, shard):
+        try:
+            for contents, _ in self.pages(bucket, *shard):
+                queue.put(contents)
+        finally:
+            queue.put(None)
+
+    def parallel(self, bucket, shards):
+        queue = Queue()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self.collect, queue, bucket, shard) for shard in shards]
+            remaining = len(futures)
+            while remaining > 0:
+                if (contents := queue.get()) is None:
+                    remaining -= 1
+                else:
+                    self.emit(bucket, contents)
+
+        for future in futures:
+            future.result()
+
     def process(self, item):
-        response = self.client.list_objects_v2(Bucket=item.bucket, Prefix=item.prefix)
-        self.next.append([S3Object(item.bucket, content['Key']) for content in response.get('Contents', list())])
+        shards = self.shards(item)
+        self.metrics.log(f'listing s3://{item.bucket}/{item.prefix} in {len(shards)} shards')
+
+        if self.concurrency > 1 and len(shards) > 1:
+            self.parallel(item.bucket, shards)
+        else:
+            for shard in shards:
+                for contents, _ in self.pages(item.bucket, *shard):
+                    self.emit(item.bucket, contents)
 
     def changed(self):
-        while items := self.prev.read(size=-1):
-            for item in items:
-                self.process(item)
+        for item in self.prev.items():
+            self.process(item)
 
     def flush(self):
         self.changed()
 
 class S3Delete:
-    def __init__(self):
-        self.client = client('s3')
+    def __init__(self, concurrency=4, retries=3):
+        self.client = client('s3', connections=concurrency)
+        self.concurrency = concurrency
+        self.retries = retries
         self.input = 'dict'
         self.output = 'dict'
 
@@ -196,8 +509,8 @@ class S3Delete:
         self.prev.subscribe(self.changed)
 
     def process(self, items):
-        objects = [{ 'Key': item.key } for item in items]
-        self.client.delete_objects(Bucket=items[0].bucket, Delete={ 'Objects': objects })
+        self.metrics.log(f'deleting {len(items)} objects')
+        delete_objects(self.client, items, self.concurrency, self.retries)
 
     def changed(self):
         while items := self.prev.read(size=-1):
@@ -208,9 +521,11 @@ class S3Delete:
         self.changed()
 
 class S3Rename:
-    def __init__(self, key):
+    def __init__(self, key, chunksize=256*1024*1024, concurrency=8):
         self.key = key
-        self.client = client('s3')
+        self.chunksize = chunksize
+        self.concurrency = concurrency
+        self.client = client('s3', connections=concurrency)
         self.input = 'dict'
         self.output = 'dict'
 
@@ -221,14 +536,45 @@ class S3Rename:
         self.metadata = metadata
         self.prev.subscribe(self.changed)
 
+    def copy(self, item, target):
+        self.client.copy_object(CopySource={'Bucket': item.bucket, 'Key': item.key}, Bucket=target.bucket, Key=target.key)
+
+    def copy_part(self, item, target, upload_id, part, start, end):
+        response = self.client.upload_part_copy(CopySource={'Bucket': item.bucket, 'Key': item.key}, CopySourceRange=f'bytes={start}-{end}', Bucket=target.bucket, Key=target.key, UploadId=upload_id, PartNumber=part)
+        return {'ETag': response['CopyPartResult']['ETag'], 'PartNumber': part}
+
+    def submit(self, executor, uploads, item, target):
+        target.total = item.total if hasattr(item, 'total') else measure_object(self.client, item.bucket, item.key)
+        self.metrics.log(f'copying {item.bucket}/{item.key} to {target.key}; {target.total} bytes')
+
+        if target.total <= self.chunksize:
+            return [executor.submit(self.copy, item, target)]
+
+        size = max(self.chunksize, -(-target.total // MAXIMUM_PARTS))
+        uploads[target] = self.client.create_multipart_upload(Bucket=target.bucket, Key=target.key)['UploadId']
+        return [executor.submit(self.copy_part, item, target, uploads[target], part, start, min(start + size, target.total) - 1) for part, start in enumerate(range(0, target.total, size), start=1)]
+
     def process(self, items):
-        result = list()
-        for item in items:
-            result.append(S3Object(item.bucket, self.key(self.metadata)))
-            self.metrics.log(f'copying {item.bucket}/{item.key} to {result[-1].key}')
-            self.client.copy_object(CopySource=f'{item.bucket}/{item.key}', Bucket=item.bucket, Key=result[-1].key)
-            self.client.delete_object(Bucket=item.bucket, Key=item.key)
-        return result
+        targets = [S3Object(item.bucket, self.key(self.metadata)) for item in items]
+        uploads = dict()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            try:
+                copies = [self.submit(executor, uploads, item, target) for item, target in zip(items, targets)]
+                parts = [[future.result() for future in futures] for futures in copies]
+                for target, results in zip(targets, parts):
+                    if target in uploads:
+                        self.client.complete_multipart_upload(Bucket=target.bucket, Key=target.key, UploadId=uploads.pop(target), MultipartUpload={'Parts': results})
+            except BaseException:
+                for target, upload_id in uploads.items():
+                    self.client.abort_multipart_upload(Bucket=target.bucket, Key=target.key, UploadId=upload_id)
+                raise
+
+        delete_objects(self.client, items, self.concurrency)
+        for target in targets:
+            object_cache.forget(target.bucket, target.key)
+
+        return targets
 
     def changed(self):
         while items := self.prev.read(size=-1):
@@ -238,9 +584,12 @@ class S3Rename:
         self.changed()
 
 class S3Chunk:
-    def __init__(self, chunksize):
+    def __init__(self, chunksize, delimiter=None, probesize=64*1024, concurrency=8):
         self.chunksize = chunksize
-        self.client = client('s3')
+        self.delimiter = delimiter
+        self.probesize = probesize
+        self.concurrency = concurrency
+        self.client = client('s3', connections=concurrency)
         self.input = 'dict'
         self.output = 'dict'
 
@@ -252,7 +601,10 @@ class S3Chunk:
     def changed(self):
         while items := self.prev.read(size=-1):
             for item in items:
-                self.next.append(item.split(self.chunksize))
+                ranges = item.split(self.chunksize)
+                if self.delimiter is not None and len(ranges) > 1:
+                    ranges = align_ranges(self.client, ranges, self.delimiter, self.probesize, self.concurrency)
+                self.next.append(ranges)
 
     def flush(self):
         self.changed()
@@ -270,15 +622,4 @@ class S3KeyExists:
             return self.key(value)
 
     def evaluate(self, value):
-        try:
-            self.client.head_object(
-                Bucket=self.bucket,
-                Key=self.get_value(value)
-            ) 
-        except ClientError as ex:
-            if ex.response['Error']['Code'] == '404':
-                return False
-            else:
-                raise
-
-        return True
+        return object_cache.head(self.client, self.bucket, self.get_value(value))[0] is not None
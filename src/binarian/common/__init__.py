@@ -1,9 +1,11 @@
-from .conditional import Conditional
+from .conditional import Conditional, AsyncConditional
 from .consumers import DictConsumer, BinaryConsumer
-from .throttling import AcquireToken, ReleaseToken
+from .throttling import AcquireToken, ReleaseToken, AsyncAcquireToken, AsyncReleaseToken
 from .foreach import ForEachChunk, ForEachItem, ForEachItemParallel
 from .objects import Singleton, OneToMany, OneToOne
 from .sorting import QuickSort, MergeSort, DataMarker, MergeGroup, MinMax
 from .debugging import DictDebug, BinaryDebug
 from .waiting import WaitAll
-from .pickle import Serialize, Deserialize
\ No newline at end of file
+from .pickle import Serialize, Deserialize
+from .offload import Offload
+from .tee import Tee
\ No newline at end of file
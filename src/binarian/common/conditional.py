@@ -1,4 +1,6 @@
-from ..engine import Funnel
+from inspect import iscoroutinefunction
+from ..engine import Funnel, AsyncFunnel
+from ..engine.asynchronous import blocking
 
 class Conditional:
     def __init__(self, condition, steps=[], inverse=False):
@@ -22,15 +24,41 @@ class Conditional:
         return self.condition(value) if not self.inverse else not self.condition(value)
 
     def complete(self):
-        while value := self.funnel.read(size=1):
-            self.next.append(value)
+        if values := self.funnel.read(size=-1):
+            self.next.append(values)
 
     def changed(self):
-        while value := self.prev.read(size=1):
-            if not self.satisfies(value[0]):
-                self.next.append(value)
+        for value in self.prev.items():
+            if not self.satisfies(value):
+                self.next.append([value])
             else:
-                self.funnel.append(value)
+                self.funnel.append([value])
 
     def flush(self):
         self.funnel.flush()
+
+class AsyncConditional(Conditional):
+    def __init__(self, condition, steps=[], inverse=False):
+        self.condition = condition.evaluate
+        self.inverse = inverse
+        self.funnel = AsyncFunnel(steps)
+        self.input = 'dict'
+        self.output = 'dict'
+
+    async def satisfies(self, value):
+        result = await self.condition(value) if iscoroutinefunction(self.condition) else await blocking(self.condition, value)
+        return result if not self.inverse else not result
+
+    async def complete(self):
+        if values := self.funnel.read(size=-1):
+            await self.next.append(values)
+
+    async def changed(self):
+        for value in self.prev.items():
+            if not await self.satisfies(value):
+                await self.next.append([value])
+            else:
+                await self.funnel.append([value])
+
+    async def flush(self):
+        await self.funnel.flush()
@@ -10,8 +10,9 @@ class DictDebug:
         self.prev.subscribe(self.changed)
 
     def changed(self):
-        while chunks := self.prev.read(size=1):
-            self.metrics.log(f'debug {chunks[0]}')
+        for chunks in self.prev.batches():
+            for chunk in chunks:
+                self.metrics.log(f'debug {chunk}')
             self.next.append(chunks)
     
     def flush(self):
@@ -20,8 +20,8 @@ class ForEachItem:
         self.prev.subscribe(self.changed)
 
     def completed(self):
-        while value := self.funnel.read(size=1):
-            self.next.append(value)
+        if values := self.funnel.read(size=-1):
+            self.next.append(values)
 
     def changed(self):
         self.process()
@@ -100,8 +100,8 @@ class ForEachItemParallel:
         funnel = Funnel(self.steps(**kwards))
 
         def completed():
-            while value := funnel.read(size=1):
-                self.next.append(value)
+            if values := funnel.read(size=-1):
+                self.next.append(values)
             
         funnel.bind(self.metrics, self.metadata, prev=DictPipe())
         funnel.subscribe(completed)
@@ -143,8 +143,8 @@ class ForEachChunk:
         self.prev.subscribe(self.changed)
 
     def completed(self):
-        while value := self.funnel.read(size=1):
-            self.next.append(value)
+        if values := self.funnel.read(size=-1):
+            self.next.append(values)
 
     def changed(self):
         if self.prev.length() > 0:
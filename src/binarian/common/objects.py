@@ -41,9 +41,8 @@ class OneToMany:
         self.prev.subscribe(self.changed)
     
     def changed(self):
-        while data := self.prev.read(size=1):
-            for item in data:
-                self.next.append(self.transform(item))
+        for data in self.prev.batches():
+            self.next.append([value for item in data for value in self.transform(item)])
 
     def flush(self):
         self.changed()
@@ -0,0 +1,122 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from dill import dumps, loads
+from ..engine import Funnel
+from ..engine.common import Metadata, Metrics
+from ..engine.pipes import create_pipe
+
+def receive(funnel, batch):
+    if not isinstance(batch, tuple):
+        return funnel.append(batch)
+
+    memory = SharedMemory(name=batch[0])
+    try:
+        with memory.buf[:batch[1]] as view:
+            funnel.append(view)
+    finally:
+        memory.close()
+
+def process_batch(steps, name, input, batch):
+    metadata = Metadata()
+    funnel = Funnel(loads(steps)())
+    funnel.bind(Metrics(name), metadata, prev=create_pipe(input))
+    receive(funnel, batch)
+    funnel.flush()
+    return funnel.read(size=-1), metadata.data
+
+class Offload:
+    def __init__(self, steps, processes=2, batchsize=None, delimiter=b'\n', input='binary', output='dict'):
+        self.steps = dumps(steps, recurse=True)
+        self.processes = processes
+        self.delimiter = delimiter
+        self.worker = None
+        self.pending = deque()
+        self.input = input
+        self.output = output
+        self.batchsize = batchsize if batchsize is not None else 4*1024*1024 if self.input == 'binary' else 1024
+
+    def bind(self, prev, next, metrics, metadata):
+        self.prev = prev
+        self.next = next
+        self.metrics = metrics
+        self.metadata = metadata
+        self.prev.subscribe(self.changed)
+
+    def init_worker(self):
+        if self.worker is None:
+            self.worker = ProcessPoolExecutor(max_workers=self.processes)
+
+    def close_worker(self):
+        if self.worker is not None:
+            self.worker.shutdown(cancel_futures=True)
+            self.worker = None
+        while len(self.pending) > 0:
+            self.release(self.pending.popleft()[0])
+
+    def release(self, memory):
+        if memory is not None:
+            memory.close()
+            memory.unlink()
+
+    def share(self, views):
+        offset = 0
+        length = sum([len(view) for view in views])
+        memory = SharedMemory(create=True, size=max(1, length))
+        for view in views:
+            memory.buf[offset:offset+len(view)] = view
+            offset += len(view)
+        return memory, (memory.name, length)
+
+    def submit(self, chunk):
+        memory, batch = self.share(chunk) if self.input == 'binary' else (None, chunk)
+        self.pending.append((memory, self.worker.submit(process_batch, self.steps, self.metrics.name, self.input, batch)))
+
+        while len(self.pending) > 2 * self.processes:
+            self.complete()
+
+    def complete(self):
+        memory, future = self.pending.popleft()
+        try:
+            data, metadata = future.result()
+        finally:
+            self.release(memory)
+
+        for key, value in metadata.items():
+            self.metadata.set(key, value)
+
+        if data:
+            self.next.append(data)
+
+    def take(self, size):
+        return self.prev.read_views(size=size) if self.input == 'binary' else self.prev.read(size=size)
+
+    def split(self, size):
+        if self.input != 'binary':
+            return self.take(size=self.batchsize) if self.prev.length() >= size else None
+        if self.prev.length() >= size and (index := self.prev.rfind(self.delimiter)) > -1:
+            return self.take(size=index+len(self.delimiter))
+
+    def process(self, size):
+        self.init_worker()
+        while chunk := self.split(size):
+            self.submit(chunk)
+
+    def changed(self):
+        try:
+            self.process(size=self.batchsize)
+            while len(self.pending) > 0 and self.pending[0][1].done():
+                self.complete()
+        except Exception:
+            self.close_worker()
+            raise
+
+    def flush(self):
+        try:
+            self.process(size=1)
+            if self.prev.length() > 0:
+                self.submit(self.take(size=-1))
+            while len(self.pending) > 0:
+                self.complete()
+        finally:
+            self.close_worker()
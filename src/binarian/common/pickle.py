@@ -12,7 +12,7 @@ class Serialize:
         self.prev.subscribe(self.changed)
 
     def changed(self):
-        while items := self.prev.read(size=1):
+        for items in self.prev.batches():
             self.next.append([b64encode(dumps(item)).decode('ascii') for item in items])
 
     def flush(self):
@@ -29,7 +29,7 @@ class Deserialize:
         self.prev.subscribe(self.changed)
 
     def changed(self):
-        while items := self.prev.read(size=1):
+        for items in self.prev.batches():
             self.next.append([loads(b64decode(item.encode('ascii'))) for item in items])
 
     def flush(self):
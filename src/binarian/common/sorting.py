@@ -1,6 +1,10 @@
 from heapq import heappush, heappop, heapify
+from operator import attrgetter
 from ..engine import Funnel, BinaryPipe, DictPipe
 
+def rows(data):
+    return [row for item in data for row in (item if hasattr(item, 'gather') else [item])]
+
 class MinMax:
     def __init__(self, key):
         self.key = key
@@ -20,6 +24,9 @@ class MinMax:
 
     def apply(self, data):
         for item in data:
+            if hasattr(item, 'gather'):
+                self.apply(item)
+                continue
             if self.min is None or self.min > item.key:
                 self.min = item.key
                 self.min_offset = self.offset
@@ -74,6 +81,8 @@ class DataMarker:
     def measure(self, data, index):
         if index == len(data)-1:
             index += 1
+        if hasattr(data, 'measure'):
+            return data.measure(index)
         return sum([len(data[i].data) for i in range(index)])
 
     def collection(self, data):
@@ -84,7 +93,12 @@ class DataMarker:
 
     def flush(self):
         if data := self.prev.read(size=-1):
-            self.markdown(data)
+            if all(hasattr(item, 'measure') for item in data):
+                data = [data[0].concat(data[1:])]
+                self.markdown(data[0])
+            else:
+                data = rows(data)
+                self.markdown(data)
             self.next.append(data)
 
 class MergeGroupCollection(object):
@@ -167,7 +181,7 @@ class MergeGroup:
                 self.next.append([MergeGroupCollection((xaxis[index], xaxis[min(index+hop,len(xaxis)-1)]), self.consolidate([MergeGroupObject(offset, (xaxis[index]!=offset[0], xaxis[min(index+hop,len(xaxis)-1)]==offset[1] or offset[5])) for offset in offsets if (not offset[5] or offset[1]>xaxis[index]) and xaxis[index]<=offset[1] and offset[0]<xaxis[min(index+hop,len(xaxis)-1)]]))])
 
 class QuickSort:
-    def __init__(self, key):
+    def __init__(self, key=None):
         self.key = key
         self.input = 'dict'
         self.output = 'dict'
@@ -178,13 +192,18 @@ class QuickSort:
 
     def flush(self):
         if data := self.prev.read(size=-1):
-            data.sort(key=self.key)
+            if self.key is None and all(hasattr(item, 'sorted') for item in data):
+                data = [data[0].concat(data[1:]).sorted()]
+            else:
+                data = rows(data)
+                data.sort(key=attrgetter('key') if self.key is None else self.key)
             self.next.append(data)
 
 class MergeSort:
-    def __init__(self, piecesize=4*1024*1024, key=lambda x: x, steps=[]):
+    def __init__(self, piecesize=4*1024*1024, key=lambda x: x, steps=[], batchsize=1024):
         self.key = key
         self.piecesize = piecesize
+        self.batchsize = batchsize
         self.steps = steps
         self.input = 'dict'
         self.output = 'dict'
@@ -224,17 +243,24 @@ class MergeSort:
                 else:
                     funnel.flush()
                     funnels[i] = None
-                    while item := funnel.read(size=1):
-                        if filters[i](item[0].key, indices[i]):
+                    for item in funnel.read(size=-1):
+                        if filters[i](item.key, indices[i]):
                             indices[i] += 1
-                            heappush(heads, (item[0].key, i, item[0]))
+                            heappush(heads, (item.key, i, item))
                     break
 
         for i in range(len(data)):
             push(i)
 
+        output = list()
         heapify(heads)
         while len(heads) > 0:
             item = heappop(heads)
-            self.next.append([item[2]])
+            output.append(item[2])
             push(item[1])
+            if len(output) >= self.batchsize:
+                self.next.append(output)
+                output = list()
+
+        if len(output) > 0:
+            self.next.append(output)
@@ -0,0 +1,44 @@
+from threading import Lock
+from ..engine import Funnel, Stage
+from ..engine.pipes import create_pipe
+
+class Tee:
+    def __init__(self, branches, threaded=False, capacity=None):
+        self.lock = Lock()
+        self.capacity = capacity
+        self.outputs = [steps[-1].output for steps in branches]
+        self.funnels = [Funnel(steps if not threaded else [Stage(steps, capacity=capacity)]) for steps in branches]
+        self.input = branches[0][0].input
+        self.output = 'dict'
+
+    def bind(self, prev, next, metrics, metadata):
+        self.prev = prev
+        self.next = next
+        if any([output != 'dict' for output in self.outputs]):
+            raise ValueError(f'tee branches must end with a dict step, e.g. BinaryConsumer; got {", ".join(self.outputs)}')
+        for funnel in self.funnels:
+            funnel.bind(metrics, metadata, prev=create_pipe(self.input))
+            funnel.subscribe(self.completed(funnel))
+        self.prev.subscribe(self.changed)
+
+    def completed(self, funnel):
+        def completed():
+            if values := funnel.read(size=-1):
+                with self.lock:
+                    self.next.append(values)
+
+        return completed
+
+    def changed(self):
+        while chunk := self.prev.read(size=self.capacity or -1):
+            for funnel in self.funnels:
+                funnel.append(chunk)
+
+    def flush(self):
+        self.changed()
+        for funnel in self.funnels:
+            funnel.flush()
+
+    def close(self):
+        for funnel in self.funnels:
+            funnel.close()
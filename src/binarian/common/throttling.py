@@ -1,3 +1,5 @@
+from asyncio import wait_for
+
 class Token:
     def __init__(self, item, value):
         self.item = item
@@ -17,9 +19,9 @@ class AcquireToken:
         self.prev.subscribe(self.changed)
 
     def changed(self):
-        while value := self.prev.read(size=1):
+        for value in self.prev.items():
             item = self.queue.get(timeout=self.timeout)
-            token = Token(item=item, value=value[0])
+            token = Token(item=item, value=value)
             self.metrics.log(f'acquired {token.item}')
             self.next.append([token])
 
@@ -43,9 +45,35 @@ class ReleaseToken:
         self.metrics.log(f'released {item}')
 
     def changed(self):
-        while token := self.prev.read(size=1):
-            self.release(token[0].item)
-            self.next.append([token[0].value])
+        for tokens in self.prev.batches():
+            for token in tokens:
+                self.release(token.item)
+            self.next.append([token.value for token in tokens])
 
     def flush(self):
         pass
+
+class AsyncAcquireToken(AcquireToken):
+    async def changed(self):
+        for value in self.prev.items():
+            item = await wait_for(self.queue.get(), timeout=self.timeout)
+            token = Token(item=item, value=value)
+            self.metrics.log(f'acquired {token.item}')
+            await self.next.append([token])
+
+    async def flush(self):
+        pass
+
+class AsyncReleaseToken(ReleaseToken):
+    def release(self, item):
+        self.queue.put_nowait(item)
+        self.metrics.log(f'released {item}')
+
+    async def changed(self):
+        for tokens in self.prev.batches():
+            for token in tokens:
+                self.release(token.item)
+            await self.next.append([token.value for token in tokens])
+
+    async def flush(self):
+        pass
@@ -1,3 +1,5 @@
 from .funnel import Funnel
 from .pipeline import Pipeline
 from .pipes import BinaryPipe, DictPipe
+from .stage import Stage
+from .asynchronous import AsyncFunnel, AsyncPipeline
@@ -0,0 +1,119 @@
+from asyncio import get_running_loop, run_coroutine_threadsafe
+from concurrent.futures import ThreadPoolExecutor
+from inspect import iscoroutinefunction
+from .common import Metadata, Metrics
+from .pipes import BinaryPipe, DictPipe, create_pipe
+
+class AsyncBinaryPipe(BinaryPipe):
+    async def append(self, chunk):
+        self.push(chunk)
+        if self.callback is not None:
+            await self.callback()
+
+class AsyncDictPipe(DictPipe):
+    async def append(self, chunk):
+        self.push(chunk)
+        if self.callback is not None:
+            await self.callback()
+
+def create_async_pipe(type, buffersize=None, queuesize=None):
+    return AsyncBinaryPipe(capacity=buffersize) if type == 'binary' else AsyncDictPipe(capacity=queuesize)
+
+def asynchronous(step):
+    return step if iscoroutinefunction(step.flush) else AsyncStep(step)
+
+async def blocking(function, *args, executor=None):
+    return await get_running_loop().run_in_executor(executor, function, *args)
+
+class AsyncStep:
+    def __init__(self, step):
+        self.step = step
+        self.loop = None
+        self.worker = None
+        self.input = step.input
+        self.output = step.output
+
+    def bind(self, prev, next, metrics, metadata):
+        self.prev = prev
+        self.next = next
+        self.metrics = metrics
+        self.inner = create_pipe(self.input)
+        self.outer = create_pipe(self.output)
+        self.step.bind(self.inner, self.outer, metrics, metadata)
+        self.counters = metrics.track(type(self.step).__name__, self.step, self.inner, self.outer)
+        self.outer.subscribe(self.completed)
+        self.prev.subscribe(self.changed)
+
+    def completed(self):
+        if chunk := self.outer.read(size=-1):
+            run_coroutine_threadsafe(self.next.append(chunk), self.loop).result()
+
+    async def call(self, function, *args):
+        if self.worker is None:
+            self.loop = get_running_loop()
+            self.worker = ThreadPoolExecutor(max_workers=1)
+        return await self.loop.run_in_executor(self.worker, function, *args)
+
+    async def changed(self):
+        if chunk := self.prev.read(size=-1):
+            await self.call(self.inner.append, chunk)
+
+    async def flush(self):
+        await self.call(self.metrics.call, self.counters, self.step.flush)
+        self.metrics.settle(self.counters, self.step)
+        self.worker.shutdown()
+        self.worker = None
+
+class AsyncFunnel:
+    def __init__(self, steps, buffersize=None, queuesize=None):
+        self.steps = [asynchronous(step) for step in steps]
+        self.buffersize = buffersize
+        self.queuesize = queuesize
+        self.first = None
+        self.last = None
+
+    def bind(self, metrics, metadata, prev=None):
+        prev = AsyncDictPipe(capacity=self.queuesize) if prev is None else prev
+        self.metrics = metrics
+        self.counters = list()
+        self.last = self.first = prev
+        for step in self.steps:
+            next = create_async_pipe(step.output, self.buffersize, self.queuesize)
+            step.bind(prev, next, metrics, metadata)
+            self.counters.append(None if isinstance(step, AsyncStep) else metrics.track(type(step).__name__, step, prev, next, timed=False))
+            self.last = prev = next
+
+    def read(self, size=-1):
+        return self.last.read(size)
+
+    async def flush(self):
+        for step, counters in zip(self.steps, self.counters):
+            await step.flush()
+            self.metrics.settle(counters, step)
+
+    def subscribe(self, callback):
+        self.last.subscribe(callback)
+
+    async def append(self, chunk):
+        await self.first.append(chunk)
+
+class AsyncPipeline:
+    def __init__(self, name, steps, buffersize=None, queuesize=None):
+        self.name = name
+        self.funnel = AsyncFunnel(steps, buffersize, queuesize)
+
+    def complete(self, metrics, metadata):
+        for key in metadata.keys():
+            metrics.log(f'{key} -> {metadata.get(key)}')
+        metrics.publish()
+
+    async def start(self, input=None, metrics=None, metadata=None):
+        metadata = metadata if metadata else Metadata()
+        metrics = metrics if metrics else Metrics(self.name)
+        self.funnel.bind(metrics, metadata)
+
+        await self.funnel.append([input])
+        await self.funnel.flush()
+        self.complete(metrics, metadata)
+
+        return self.funnel.read(size=-1)
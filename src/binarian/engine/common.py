@@ -1,9 +1,80 @@
 from datetime import datetime
+from os import getenv
+from os.path import join
+from tempfile import gettempdir
 from resource import getrusage, RUSAGE_SELF
+from threading import Lock, local
+from time import perf_counter
+from orjson import dumps, OPT_INDENT_2
 
-class Metrics:
+class Counters:
     def __init__(self, name):
         self.name = name
+        self.instances = 0
+        self.calls = 0
+        self.changed = 0.0
+        self.flush = 0.0
+        self.blocked = 0.0
+        self.units = ('items', 'items')
+        self.totals = [0, 0]
+        self.peaks = [0, 0]
+        self.live = dict()
+        self.lock = Lock()
+
+    def add(self, step, prev, next):
+        with self.lock:
+            self.instances += 1
+            self.units = (self.unit(prev), self.unit(next))
+            self.live[id(step)] = (step, prev, next)
+
+    def settle(self, step):
+        with self.lock:
+            if (entry := self.live.pop(id(step), None)) is not None:
+                for side, pipe in enumerate(entry[1:]):
+                    self.totals[side] += pipe.total
+                    self.peaks[side] = max(self.peaks[side], pipe.peak)
+
+    def count(self):
+        with self.lock:
+            self.calls += 1
+
+    def charge(self, phase, elapsed):
+        with self.lock:
+            setattr(self, phase, getattr(self, phase) + elapsed)
+
+    def unit(self, pipe):
+        return 'bytes' if hasattr(pipe, 'read_views') else 'items'
+
+    def pipes(self, side):
+        with self.lock:
+            pipes = [entry[side+1] for entry in self.live.values()]
+            return {
+                'unit': self.units[side],
+                'total': self.totals[side] + sum([pipe.total for pipe in pipes]),
+                'peak': max([self.peaks[side]] + [pipe.peak for pipe in pipes]),
+            }
+
+    def report(self, elapsed):
+        return {
+            'step': self.name,
+            'instances': self.instances,
+            'calls': self.calls,
+            'calls_per_second': self.calls / elapsed if elapsed > 0 else 0.0,
+            'changed_seconds': self.changed,
+            'flush_seconds': self.flush,
+            'blocked_seconds': self.blocked,
+            'input': self.pipes(0),
+            'output': self.pipes(1),
+        }
+
+class Metrics:
+    def __init__(self, name, output=None):
+        self.name = name
+        self.output = output if output is not None else getenv('BINARIAN_METRICS')
+        self.started = perf_counter()
+        self.counters = dict()
+        self.names = dict()
+        self.local = local()
 
     def raw(self, data):
         print(f'{data}\n', end='')
@@ -11,6 +82,99 @@ class Metrics:
     def log(self, data):
         print(f'{datetime.utcnow().strftime("%H:%M:%S")} {int(getrusage(RUSAGE_SELF).ru_maxrss / 1024):04} {self.name}: {data}\n', end='')
 
+    def track(self, name, step, prev, next, timed=True):
+        if getattr(step, 'nested', False):
+            return None
+
+        counters = self.counters.setdefault(name, Counters(name))
+        counters.add(step, prev, next)
+        self.names[id(step)] = name
+
+        if timed and prev.callback is not None:
+            prev.subscribe(self.timed(counters, 'changed', prev.callback))
+
+        return counters
+
+    def settle(self, counters, step):
+        if counters is not None:
+            counters.settle(step)
+            self.names.pop(id(step), None)
+
+    def timed(self, counters, phase, callback):
+        def wrapper():
+            self.enter(counters, phase)
+            try:
+                return callback()
+            finally:
+                self.leave()
+
+        return wrapper
+
+    def call(self, counters, callback):
+        return callback() if counters is None else self.timed(counters, 'flush', callback)()
+
+    def enter(self, counters, phase):
+        now = perf_counter()
+        stack = self.stack()
+        if len(stack) > 0:
+            stack[-1][0].charge(stack[-1][1], now - stack[-1][2])
+        counters.count()
+        stack.append([counters, phase, now])
+
+    def leave(self):
+        now = perf_counter()
+        stack = self.stack()
+        counters, phase, started = stack.pop()
+        counters.charge(phase, now - started)
+        if len(stack) > 0:
+            stack[-1][2] = now
+
+    def stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = list()
+        return self.local.stack
+
+    def report(self):
+        elapsed = perf_counter() - self.started
+        return {
+            'pipeline': self.name,
+            'elapsed_seconds': elapsed,
+            'maxrss_bytes': getrusage(RUSAGE_SELF).ru_maxrss * 1024,
+            'steps': [counters.report(elapsed) for counters in self.counters.values()],
+        }
+
+    def prometheus(self, report):
+        lines = list()
+        pipeline = report['pipeline'].replace('\\', '\\\\').replace('"', '\\"')
+
+        def metric(name, type, rows):
+            lines.append(f'# TYPE binarian_{name} {type}')
+            lines.extend([f'binarian_{name}{{pipeline="{pipeline}",{labels}}} {value}' for labels, value in rows])
+
+        steps = report['steps']
+        metric('step_calls_total', 'counter', [(f'step="{step["step"]}"', step['calls']) for step in steps])
+        metric('step_calls_per_second', 'gauge', [(f'step="{step["step"]}"', step['calls_per_second']) for step in steps])
+        metric('step_seconds_total', 'counter', [(f'step="{step["step"]}",phase="{phase}"', step[f'{phase}_seconds']) for step in steps for phase in ['changed', 'flush', 'blocked']])
+        metric('step_input_total', 'counter', [(f'step="{step["step"]}",unit="{step["input"]["unit"]}"', step['input']['total']) for step in steps])
+        metric('step_output_total', 'counter', [(f'step="{step["step"]}",unit="{step["output"]["unit"]}"', step['output']['total']) for step in steps])
+        metric('step_input_peak', 'gauge', [(f'step="{step["step"]}",unit="{step["input"]["unit"]}"', step['input']['peak']) for step in steps])
+        metric('maxrss_bytes', 'gauge', [('', report['maxrss_bytes'])])
+
+        return '\n'.join(lines).replace(',}', '}') + '\n'
+
+    def path(self, extension):
+        return join(self.output or gettempdir(), f'{self.name.replace("/", "_")}.{extension}')
+
+    def publish(self):
+        report = self.report()
+        self.log(f'metrics {dumps(report).decode()}')
+
+        if self.output:
+            with open(self.path('json'), 'wb') as file:
+                file.write(dumps(report, option=OPT_INDENT_2))
+            with open(self.path('prom'), 'w') as file:
+                file.write(self.prometheus(report))
+
 class Metadata:
     def __init__(self):
         self.data = dict()
@@ -1,25 +1,36 @@
-from .pipes import BinaryPipe, DictPipe
+from .pipes import DictPipe, create_pipe
 
 class Funnel:
-    def __init__(self, steps):
+    def __init__(self, steps, buffersize=None, queuesize=None):
         self.steps = steps
+        self.buffersize = buffersize
+        self.queuesize = queuesize
         self.first = None
         self.last = None
 
-    def bind(self, metrics, metadata, prev=None):
-        prev = DictPipe() if prev is None else prev
+    def bind(self, metrics, metadata, prev=None, prefix=''):
+        prev = DictPipe(capacity=self.queuesize) if prev is None else prev
+        self.metrics = metrics
+        self.counters = list()
         self.last = self.first = prev 
         for step in self.steps:
-            next = BinaryPipe() if step.output == 'binary' else DictPipe()
+            next = create_pipe(step.output, self.buffersize, self.queuesize)
             step.bind(prev, next, metrics, metadata)
+            self.counters.append(metrics.track(f'{prefix}{type(step).__name__}', step, prev, next))
             self.last = prev = next
 
     def read(self, size=-1):
         return self.last.read(size)
 
     def flush(self):
+        for step, counters in zip(self.steps, self.counters):
+            self.metrics.call(counters, step.flush)
+            self.metrics.settle(counters, step)
+
+    def close(self):
         for step in self.steps:
-            step.flush()
+            if (close := getattr(step, 'close', None)) is not None:
+                close()
 
     def subscribe(self, callback):
         self.last.subscribe(callback)
@@ -1,28 +1,38 @@
+from os import getenv
 from .common import Metadata, Metrics
-from .pipes import BinaryPipe, DictPipe
+from .profiling import Profiler
+from .pipes import DictPipe, create_pipe
+from .stage import Stage
 
 class Pipeline:
-    def __init__(self, name, steps):
+    def __init__(self, name, steps, buffersize=None, queuesize=None, threaded=False):
         self.name = name
-        self.steps = steps
+        self.steps = steps if not threaded else [Stage([step], buffersize=buffersize, queuesize=queuesize) for step in steps]
+        self.buffersize = buffersize
+        self.queuesize = queuesize
 
     def init(self, metrics, metadata):
-        prev = DictPipe()
-        pipes = list()
+        prev = DictPipe(capacity=self.queuesize)
         self.pipe = prev
-        pipes.append(prev)
-        for step in self.steps:
-            next = BinaryPipe() if step.output == 'binary' else DictPipe()
+        self.counters = list()
+        for index, step in enumerate(self.steps):
+            next = create_pipe(step.output, self.buffersize, self.queuesize)
+            if getattr(step, 'nested', False):
+                step.prefix = f'{index}.'
             step.bind(prev, next, metrics, metadata)
+            self.counters.append(metrics.track(f'{index}.{type(step).__name__}', step, prev, next))
             prev = next
-            pipes.append(step)
-            pipes.append(prev)
-        metrics.pipes = pipes
         return prev
 
-    def flush(self):
+    def flush(self, metrics):
+        for step, counters in zip(self.steps, self.counters):
+            metrics.call(counters, step.flush)
+            metrics.settle(counters, step)
+
+    def close(self):
         for step in self.steps:
-            step.flush()
+            if (close := getattr(step, 'close', None)) is not None:
+                close()
 
     def run(self, input):
         self.pipe.append([input])
@@ -30,14 +40,22 @@ class Pipeline:
     def complete(self, metrics, metadata):
         for key in metadata.keys():
             metrics.log(f'{key} -> {metadata.get(key)}')
+        metrics.publish()
 
-    def start(self, input=None, metrics=None, metadata=None):
+    def start(self, input=None, metrics=None, metadata=None, profile=None):
         metadata = metadata if metadata else Metadata() 
         metrics = metrics if metrics else Metrics(self.name)
+        profile = profile if profile is not None else getenv('BINARIAN_PROFILE', '0') not in ('', '0')
+        profiler = Profiler(metrics) if profile else None
         pipe = self.init(metrics, metadata)
 
-        self.run(input)
-        self.flush()
+        profiler.start() if profiler else None
+        try:
+            self.run(input)
+            self.flush(metrics)
+        finally:
+            self.close()
+            profiler.stop() if profiler else None
         self.complete(metrics, metadata)
 
         return pipe.read(size=-1)
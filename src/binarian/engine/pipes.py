@@ -1,59 +1,134 @@
+from collections import deque
+
 class BinaryPipe:
-    def __init__(self, threshold=1024*1024):
+    def __init__(self, capacity=None):
+        self.capacity = capacity
         self.offset = 0
+        self.size = 0
         self.total = 0
-        self.threshold = threshold
-        self.data = bytearray()
+        self.peak = 0
+        self.segments = deque()
         self.callback = None
 
     def append(self, chunk):
-        self.data += chunk
+        self.push(chunk)
         self.callback() if self.callback is not None else None
 
+    def push(self, chunk):
+        if len(chunk) > 0:
+            self.segments.append(chunk if isinstance(chunk, bytes) else bytes(chunk))
+            self.size += len(chunk)
+            self.total += len(chunk)
+            self.peak = max(self.peak, self.size)
+
     def subscribe(self, callback):
         self.callback = callback
 
     def length(self):
-        return len(self.data) - self.offset
+        return self.size
 
-    def read(self, size):
-        size = size if size >= 0 else self.length()
-        value = self.data[self.offset:self.offset+size]
-        self.offset = self.offset + len(value)
-        if self.offset >= self.threshold:
-            self.data = self.data[self.offset:] if len(self.data) > self.offset else bytearray()
+    def bounded(self, size):
+        return size if self.capacity is None else min(size, self.capacity)
+
+    def consume(self, size):
+        self.size -= size
+        self.offset += size
+        if self.offset == len(self.segments[0]):
+            self.segments.popleft()
             self.offset = 0
-        return bytes(value)
 
-    def rfind(self, sub):
-        return self.data.rfind(sub, self.offset, len(self.data)) - self.offset
+    def read_views(self, size):
+        views = list()
+        size = self.size if size < 0 else min(size, self.size)
+        while size > 0:
+            segment = self.segments[0]
+            available = min(size, len(segment) - self.offset)
+            views.append(memoryview(segment)[self.offset:self.offset+available])
+            self.consume(available)
+            size -= available
+        return views
+
+    def read(self, size):
+        size = self.size if size < 0 else min(size, self.size)
+        if size > 0 and self.offset == 0 and len(self.segments[0]) == size:
+            self.size -= size
+            return self.segments.popleft()
+        return b''.join(self.read_views(size))
+
+    def spans(self):
+        start = self.offset
+        position = -self.offset
+        for segment in self.segments:
+            yield position, segment, start
+            position += len(segment)
+            start = 0
 
     def find(self, sub):
-        return self.data.find(sub, self.offset, len(self.data)) - self.offset
+        tail = b''
+        for position, segment, start in self.spans():
+            if len(tail) > 0 and (index := (tail + segment[:len(sub)-1]).find(sub)) > -1:
+                return position - len(tail) + index
+            if (index := segment.find(sub, start)) > -1:
+                return position + index
+            if len(sub) > 1:
+                tail = (tail + segment[max(start, len(segment)-len(sub)+1):])[1-len(sub):]
+        return -1
+
+    def rfind(self, sub):
+        head = b''
+        for position, segment, start in reversed(list(self.spans())):
+            boundary = max(start, len(segment)-len(sub)+1)
+            if len(head) > 0 and (index := (segment[boundary:] + head).rfind(sub)) > -1:
+                return position + boundary + index
+            if (index := segment.rfind(sub, start)) > -1:
+                return position + index
+            if len(sub) > 1:
+                head = (segment[start:start+len(sub)-1] + head)[:len(sub)-1]
+        return -1
 
 class DictPipe:
-    def __init__(self, threshold = 64):
-        self.offset = 0
+    def __init__(self, capacity=None):
+        self.capacity = capacity
         self.total = 0
-        self.threshold = threshold
-        self.data = list()
+        self.peak = 0
+        self.data = deque()
         self.callback = None
 
     def append(self, chunk):
-        self.data += chunk
+        self.push(chunk)
         self.callback() if self.callback is not None else None
 
+    def push(self, chunk):
+        self.data.extend(chunk)
+        self.total += len(chunk)
+        self.peak = max(self.peak, len(self.data))
+
     def subscribe(self, callback):
         self.callback = callback
 
     def length(self):
-        return len(self.data) - self.offset
+        return len(self.data)
+
+    def bounded(self, size):
+        return size if self.capacity is None else min(size, self.capacity)
 
     def read(self, size):
-        size = size if size >= 0 else self.length()
-        value = self.data[self.offset:self.offset+size]
-        self.offset = self.offset + len(value)
-        if self.offset >= self.threshold:
-            self.data = self.data[self.offset:] if len(self.data) > self.offset else list()
-            self.offset = 0
-        return value
+        if size == 1 and len(self.data) > 0:
+            return [self.data.popleft()]
+        if size < 0 or size >= len(self.data):
+            value = list(self.data)
+            self.data.clear()
+            return value
+        return [self.data.popleft() for index in range(size)]
+
+    def batches(self, size=-1):
+        while batch := self.read(size):
+            yield batch
+
+    def items(self):
+        while len(self.data) > 0:
+            yield self.data.popleft()
+
+# capacity is a read threshold for the steps draining a pipe; only a Stage channel blocks producers on it
+def create_pipe(type, buffersize=None, queuesize=None):
+    return BinaryPipe(capacity=buffersize) if type == 'binary' else DictPipe(capacity=queuesize)
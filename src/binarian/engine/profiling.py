@@ -0,0 +1,71 @@
+from collections import Counter
+from os.path import basename
+from sys import _current_frames
+from threading import Event, Thread, enumerate as threads
+from time import clock_gettime, pthread_getcpuclockid
+
+class Profiler:
+    def __init__(self, metrics, interval=0.005):
+        self.metrics = metrics
+        self.interval = interval
+        self.clocks = dict()
+        self.samples = Counter()
+        self.stopped = Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.write()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def elapsed(self, ident):
+        try:
+            now = clock_gettime(pthread_getcpuclockid(ident))
+        except OSError:
+            return 0
+
+        previous = self.clocks.get(ident, now)
+        self.clocks[ident] = now
+        return int((now - previous) * 1000000)
+
+    def sample(self):
+        frames = _current_frames()
+        for thread in threads():
+            if thread.ident != self.thread.ident and thread.ident in frames:
+                if (elapsed := self.elapsed(thread.ident)) > 0 and (stack := self.collapse(frames[thread.ident])):
+                    self.samples[stack] += elapsed
+
+    def label(self, frame):
+        code = frame.f_code
+        if code.co_argcount > 0 and code.co_varnames[0] == 'self':
+            return self.metrics.names.get(id(frame.f_locals.get('self')))
+
+    def collapse(self, frame):
+        labels = list()
+        leaf = f'{basename(frame.f_code.co_filename)}:{frame.f_code.co_name}'
+
+        while frame is not None:
+            if (label := self.label(frame)) and (len(labels) == 0 or labels[-1] != label):
+                labels.append(label)
+            frame = frame.f_back
+
+        return ';'.join([self.metrics.name] + labels[::-1] + [leaf]) if len(labels) > 0 else None
+
+    def write(self):
+        try:
+            with open(self.metrics.path('folded'), 'w') as file:
+                for stack, count in self.samples.most_common():
+                    file.write(f'{stack} {count}\n')
+        except OSError as ex:
+            self.metrics.log(f'profile not written to {self.metrics.path("folded")}: {ex}')
+            return
+
+        self.metrics.log(f'profile written to {self.metrics.path("folded")}')
@@ -0,0 +1,119 @@
+from collections import deque
+from threading import Condition, Thread
+from time import perf_counter
+from .funnel import Funnel
+from .pipes import create_pipe
+
+class Channel:
+    def __init__(self, capacity, counters=None):
+        self.capacity = capacity
+        self.counters = counters
+        self.size = 0
+        self.closed = False
+        self.aborted = False
+        self.chunks = deque()
+        self.condition = Condition()
+
+    def put(self, chunk):
+        with self.condition:
+            if not self.closed and not self.fits(chunk):
+                started = perf_counter()
+                self.condition.wait_for(lambda: self.closed or self.fits(chunk))
+                if self.counters is not None:
+                    self.counters.charge('blocked', perf_counter() - started)
+            if not self.closed:
+                self.chunks.append(chunk)
+                self.size += len(chunk)
+                self.condition.notify_all()
+            return not self.closed
+
+    def fits(self, chunk):
+        return self.size == 0 or self.size + len(chunk) <= self.capacity
+
+    def get(self):
+        with self.condition:
+            self.condition.wait_for(lambda: self.closed or len(self.chunks) > 0)
+            if len(self.chunks) == 0:
+                return None
+            chunk = self.chunks.popleft()
+            self.size -= len(chunk)
+            self.condition.notify_all()
+            return chunk
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def abort(self):
+        with self.condition:
+            self.closed = True
+            self.aborted = True
+            self.size = 0
+            self.chunks.clear()
+            self.condition.notify_all()
+
+class Stage:
+    nested = True
+
+    def __init__(self, steps, capacity=None, buffersize=None, queuesize=None):
+        self.funnel = Funnel(steps, buffersize, queuesize)
+        self.capacity = capacity
+        self.prefix = ''
+        self.thread = None
+        self.error = None
+        self.input = steps[0].input
+        self.output = steps[-1].output
+
+    def bind(self, prev, next, metrics, metadata):
+        self.prev = prev
+        self.next = next
+        self.funnel.bind(metrics, metadata, prev=create_pipe(self.input, self.funnel.buffersize, self.funnel.queuesize), prefix=self.prefix)
+        self.channel = Channel(self.init_capacity(prev), self.funnel.counters[0])
+        self.funnel.subscribe(self.completed)
+        self.prev.subscribe(self.changed)
+
+    def init_capacity(self, prev):
+        if self.capacity is not None:
+            return self.capacity
+        if prev.capacity is not None:
+            return prev.capacity
+        return 16 * 1024 * 1024 if self.input == 'binary' else 1024
+
+    def start(self):
+        if self.thread is None:
+            self.thread = Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def run(self):
+        try:
+            while (chunk := self.channel.get()) is not None:
+                self.funnel.append(chunk)
+            if not self.channel.aborted:
+                self.funnel.flush()
+        except BaseException as ex:
+            self.error = ex
+            self.channel.close()
+
+    def completed(self):
+        if chunk := self.funnel.read(size=-1):
+            self.next.append(chunk)
+
+    def changed(self):
+        self.start()
+        while chunk := self.prev.read(size=self.channel.capacity):
+            if not self.channel.put(chunk):
+                raise self.error if self.error is not None else RuntimeError('stage closed')
+
+    def flush(self):
+        self.changed()
+        self.channel.close()
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        if self.thread is not None:
+            self.channel.abort()
+            self.thread.join()
+        self.funnel.close()
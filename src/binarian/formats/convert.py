@@ -1,17 +1,27 @@
-from orjson import dumps
+from datetime import datetime
+from orjson import dumps, OPT_APPEND_NEWLINE, OPT_PASSTHROUGH_DATETIME
 from .xml import XmlReader
 
 def default_coerce(value):
     return value
 
+def serialize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not serializable')
+
 class XmlToJson:
-    def __init__(self, rowtag, coerce=default_coerce, chunksize=4*1024*1024, windowsize=1024*1024):
+    def __init__(self, rowtag, fields=None, schema=None, coerce=default_coerce, chunksize=4*1024*1024, windowsize=1024*1024, batchsize=1024*1024, batchcount=None):
         self.rowtag = rowtag
+        self.fields = fields
+        self.schema = schema
         self.iterator = None
         self.reader = None
         self.coerce = coerce
         self.chunksize = chunksize
         self.windowsize = windowsize
+        self.batchsize = batchsize
+        self.batchcount = batchcount
         self.input = 'binary'
         self.output = 'binary'
 
@@ -24,15 +34,31 @@ class XmlToJson:
         self.prev.subscribe(self.changed)
 
     def changed(self):
-        self.process(chunksize=self.chunksize, windowsize=self.windowsize)
+        self.process(chunksize=self.prev.bounded(self.chunksize), windowsize=self.windowsize)
 
     def flush(self):
         self.process(chunksize=0, windowsize=0)
+        if self.reader is not None:
+            self.emit(lambda: True)
 
     def process(self, chunksize, windowsize):
         if self.reader is None and self.prev.length() > chunksize:
-            self.reader = XmlReader(rowtag=self.rowtag, source=self.prev)
+            self.reader = XmlReader(rowtag=self.rowtag, source=self.prev, fields=self.fields, schema=self.schema)
 
         if self.reader is not None and self.prev.length() > chunksize:
-            while data := self.reader.tick(lambda: self.prev.length() > windowsize):
-                self.next.append(dumps(data) + b'\n')
+            self.emit(lambda: self.prev.length() > windowsize)
+
+    def emit(self, condition):
+        batch = list()
+        size = 0
+
+        while (data := self.reader.tick(condition)) is not None:
+            batch.append(dumps(self.coerce(data), default=serialize, option=OPT_APPEND_NEWLINE | OPT_PASSTHROUGH_DATETIME))
+            size += len(batch[-1])
+            if size >= self.batchsize or self.batchcount is not None and len(batch) >= self.batchcount:
+                self.next.append(b''.join(batch))
+                batch = list()
+                size = 0
+
+        if len(batch) > 0:
+            self.next.append(b''.join(batch))
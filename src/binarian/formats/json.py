@@ -1,5 +1,10 @@
+from concurrent.futures import ThreadPoolExecutor
+from numpy import argsort, array, concatenate, cumsum, diff, int64, searchsorted, zeros
+from re import compile, escape
 from orjson import loads, JSONDecodeError
-from ..engine import Funnel, BinaryPipe, DictPipe
+from ..amazon.clients import client
+from ..amazon.ranges import range_cache
+from ..amazon.s3 import find_delimiter
 
 class NDJsonChunk:
     def __init__(self, chunksize=1024*1024):
@@ -13,7 +18,7 @@ class NDJsonChunk:
         self.prev.subscribe(self.changed)
 
     def changed(self):
-        if self.prev.length() > self.chunksize:
+        if self.prev.length() > self.prev.bounded(self.chunksize):
             if (index := self.prev.rfind(b'\n')) > -1:
                 chunk = self.prev.read(size=index+1)
                 self.next.append(chunk)
@@ -23,46 +28,59 @@ class NDJsonChunk:
             self.next.append(self.prev.read(size=-1))
 
 class NDJsonMeasure:
-    def __init__(self, steps=None, windowsize=1024*1024):
-        self.steps = steps
-        self.windowsize = windowsize
+    def __init__(self, delimiter=b'\n', probesize=64*1024, concurrency=4, cache=False):
+        self.delimiter = delimiter
+        self.probesize = probesize
+        self.concurrency = concurrency
+        self.cache = cache
+        self.client = client('s3', connections=concurrency)
         self.input = 'dict'
         self.output = 'dict'
 
     def bind(self, prev, next, metrics, metadata):
         self.prev = prev
         self.next = next
-        self.metrics = metrics
-        self.metadata = metadata
         self.prev.subscribe(self.changed)
 
     def find(self, item, index):
-        funnel = Funnel(self.steps())
-        funnel.bind(self.metrics, self.metadata, prev=DictPipe())
-        
-        while index < item.total-1:
-            funnel.append([item.between(start=index, end=index+self.windowsize-1)])
-            for value in funnel.read(size=-1):
-                if value == b'\n'[0]:
-                    return index
-                index += 1
+        return find_delimiter(self.client, item, index, self.delimiter, self.probesize, range_cache if self.cache else None)
 
-        raise
+    def probes(self, item):
+        return [index for index in (item.start-1, item.end) if 0 <= index < item.total-1]
 
-    def process(self, item):
-        start = item.start if item.start==0 else self.find(item, item.start-1)+1
-        end = item.end if item.end==item.total-1 else self.find(item, item.end)
+    def changed(self):
+        items = list(self.prev.items())
+        probes = [(item, index) for item in items for index in self.probes(item)]
 
-        self.next.append([item.between(start, end)])
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(probes)))) as executor:
+            found = dict(zip([(id(item), index) for item, index in probes], executor.map(lambda probe: self.find(*probe), probes)))
 
-    def changed(self):
-        while items := self.prev.read(size=1):
-            for item in items:
-                self.process(item)
+        for item in items:
+            start = item.start if item.start==0 else found[(id(item), item.start-1)]+1
+            end = item.end if item.end==item.total-1 else found[(id(item), item.end)]
+            if start <= end:
+                self.next.append([item.between(start, end)])
 
     def flush(self):
         self.changed()            
 
+MISSING = object()
+
+SCALARS = rb'(?:[^{}\[\]"]|"[^"\\]*")*?'
+
+class FieldExtractor:
+    def __init__(self, field):
+        self.names = field.split('/')
+        self.pattern = compile(rb'\{' + rb'\{'.join(SCALARS + b'"' + escape(name.encode()) + b'":' for name in self.names) + rb'(?:(-?\d+)(?=[,}])|"([^"\\]*)")')
+
+    def __call__(self, line, start=0, end=None):
+        if (match := self.pattern.match(line, start, len(line) if end is None else end)) is None:
+            return MISSING
+        value = int(match[1]) if match[1] is not None else match[2].decode()
+        for name in reversed(self.names):
+            value = {name: value}
+        return value
+
 class NDJsonIndexed:
     def __init__(self, key, data):
         self.key = key
@@ -71,10 +89,67 @@ class NDJsonIndexed:
     def __str__(self):
         return f'{self.key}:{len(self.data)}'
 
+class NDJsonRecords:
+    def __init__(self, buffers, keys, offsets, lengths, sources=None):
+        self.buffers = buffers
+        self.keys = keys
+        self.offsets = offsets
+        self.lengths = lengths
+        self.sources = sources if sources is not None else zeros(len(keys), dtype=int64)
+        self.positions = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, index):
+        offset = int(self.offsets[index])
+        return NDJsonIndexed(self.keys.item(index), self.buffers[int(self.sources[index])][offset:offset+int(self.lengths[index])])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __str__(self):
+        return f'{len(self)}:{sum([len(buffer) for buffer in self.buffers])}'
+
+    def concat(self, others):
+        items = [self] + others
+        bases = cumsum([0] + [len(item.buffers) for item in items[:-1]])
+        return NDJsonRecords(
+            [buffer for item in items for buffer in item.buffers],
+            concatenate([item.keys for item in items]),
+            concatenate([item.offsets for item in items]),
+            concatenate([item.lengths for item in items]),
+            concatenate([item.sources + base for item, base in zip(items, bases)]),
+        )
+
+    def sorted(self):
+        order = argsort(self.keys, kind='stable')
+        return NDJsonRecords(self.buffers, self.keys[order], self.offsets[order], self.lengths[order], self.sources[order])
+
+    def prefix(self):
+        if self.positions is None:
+            self.positions = concatenate([array([0], dtype=int64), cumsum(self.lengths)])
+        return self.positions
+
+    def measure(self, index):
+        return int(self.prefix()[index])
+
+    def gather(self, batchsize):
+        views = [memoryview(buffer) for buffer in self.buffers]
+        prefix = self.prefix()
+        start = 0
+        while start < len(self):
+            end = max(start + 1, int(searchsorted(prefix, prefix[start] + batchsize, side='right')) - 1)
+            yield b''.join([views[source][offset:offset+length] for source, offset, length in zip(self.sources[start:end].tolist(), self.offsets[start:end].tolist(), self.lengths[start:end].tolist())])
+            start = end
+
 class NDJsonIndex:
-    def __init__(self, extract, chunksize=1024*1024):
+    def __init__(self, extract, chunksize=1024*1024, field=None, records=False):
         self.chunksize = chunksize
         self.extract = extract
+        self.records = records
+        self.extractor = None if field is None else FieldExtractor(field)
         self.input = 'binary'
         self.output = 'dict'
 
@@ -85,30 +160,48 @@ class NDJsonIndex:
         self.prev.subscribe(self.changed)
 
     def process(self, size):
-        if self.prev.length() > size:
-            chunks = []
-            while (index := self.prev.find(b'\n')) > -1:
-                chunk = self.prev.read(size=index+1)
-                key = self.extract_key(chunk)
-                chunks.append(NDJsonIndexed(key, chunk))
-            if len(chunks) > 0:
-                self.next.append(chunks)
-
-    def extract_key(self, chunk):
+        if self.prev.length() > size and (index := self.prev.rfind(b'\n')) > -1:
+            buffer = self.prev.read(size=index+1)
+            self.next.append(self.index(buffer) if self.records else self.split(buffer))
+
+    def split(self, buffer):
+        chunks = []
+        start = 0
+        while (end := buffer.find(b'\n', start)) > -1:
+            chunk = buffer[start:end+1]
+            chunks.append(NDJsonIndexed(self.extract_key(chunk), chunk))
+            start = end + 1
+        return chunks
+
+    def index(self, buffer):
+        keys = []
+        offsets = [0]
+        while (end := buffer.find(b'\n', offsets[-1])) > -1:
+            keys.append(self.extract_key(buffer, offsets[-1], end+1))
+            offsets.append(end + 1)
+        if not all(type(key) is int and -2**63 <= key < 2**63 for key in keys):
+            return [NDJsonIndexed(key, buffer[start:end]) for key, start, end in zip(keys, offsets, offsets[1:])]
+        offsets = array(offsets, dtype=int64)
+        return [NDJsonRecords([buffer], array(keys, dtype=int64), offsets[:-1], diff(offsets))]
+
+    def extract_key(self, chunk, start=0, end=None):
+        if self.extractor is not None and (value := self.extractor(chunk, start, end)) is not MISSING:
+            return self.extract(value)
         try:
-            return self.extract(loads(chunk))
+            return self.extract(loads(chunk[start:end]))
         except JSONDecodeError:
-            self.metrics.log(f'JSON malformed: {chunk}')
+            self.metrics.log(f'JSON malformed: {chunk[start:end]}')
             raise
 
     def changed(self):
-        self.process(size=self.chunksize)
+        self.process(size=self.prev.bounded(self.chunksize))
 
     def flush(self):
         self.process(size=0)
 
 class NDJsonFlush:
-    def __init__(self):
+    def __init__(self, batchsize=1024*1024):
+        self.batchsize = batchsize
         self.input = 'dict'
         self.output = 'binary'
         self.processed = 0
@@ -121,7 +214,11 @@ class NDJsonFlush:
     def changed(self):
         while chunks := self.prev.read(size=-1):
             for chunk in chunks:
-                self.next.append(chunk.data)
+                if hasattr(chunk, 'gather'):
+                    for batch in chunk.gather(self.batchsize):
+                        self.next.append(batch)
+                else:
+                    self.next.append(chunk.data)
 
     def flush(self):
         self.changed()
@@ -1,13 +1,133 @@
+from datetime import datetime
 from lxml.etree import iterparse
 
+def local(node):
+    return node.tag.rpartition('}')[2]
+
+def append(data, tag, value):
+    if tag not in data:
+        data[tag] = value
+    elif isinstance(data[tag], list):
+        data[tag].append(value)
+    else:
+        data[tag] = [data[tag], value]
+
+def build(node, fields=None):
+    if len(node) == 0:
+        return node.text
+
+    data = dict()
+    for child in node:
+        tag = local(child)
+        if fields is None:
+            append(data, tag, build(child))
+        elif tag in fields:
+            append(data, tag, build(child, fields[tag]))
+    return data
+
+def compile_fields(fields):
+    tree = dict()
+    for field in sorted(fields, key=lambda field: field.count('/')):
+        node = tree
+        *parents, name = field.split('/')
+        for parent in parents:
+            if (node := node.setdefault(parent, dict())) is None:
+                break
+        else:
+            node[name] = None
+    return tree
+
+def parse_bool(value):
+    return value.strip().lower() in ('1', 'true', 'yes')
+
+class ZuluDatetime(datetime):
+    def isoformat(self, sep='T', timespec='auto'):
+        return super().isoformat(sep, timespec)[:-6] + 'Z'
+
+def parse_datetime(value):
+    if value.endswith('Z'):
+        return ZuluDatetime.fromisoformat(value[:-1] + '+00:00')
+    return datetime.fromisoformat(value)
+
+PARSERS = {
+    int: int,
+    float: float,
+    bool: parse_bool,
+    str: str,
+    datetime: parse_datetime,
+}
+
+EMPTY = {
+    bool: True,
+}
+
+def compile_scalar(spec):
+    parse = PARSERS.get(spec, spec)
+    empty = EMPTY.get(spec)
+    def convert(value):
+        if isinstance(value, list):
+            return [convert(item) for item in value]
+        if isinstance(value, dict):
+            return value
+        return empty if value is None else parse(value)
+    return convert
+
+def compile_list(spec):
+    convert = compile_type(spec[0]) if len(spec) > 0 else None
+    def wrap(value):
+        items = value if isinstance(value, list) else [value]
+        return items if convert is None else [convert(item) for item in items]
+    return wrap
+
+def compile_nested(tree):
+    converters = [(tag, compile_type(spec)) for tag, spec in tree.items()]
+    def convert(value):
+        if isinstance(value, list):
+            return [convert(item) for item in value]
+        if isinstance(value, dict):
+            for tag, converter in converters:
+                if tag in value:
+                    value[tag] = converter(value[tag])
+        return value
+    return convert
+
+def compile_type(spec):
+    if spec is list:
+        return compile_list([])
+    if isinstance(spec, list):
+        return compile_list(spec)
+    if isinstance(spec, dict):
+        return compile_nested(spec)
+    return compile_scalar(spec)
+
+def compile_schema(schema):
+    tree = dict()
+    for field, spec in sorted(schema.items(), key=lambda entry: entry[0].count('/')):
+        node = tree
+        *parents, name = field.split('/')
+        for parent in parents:
+            child = node.get(parent, dict())
+            node[parent] = child = [dict()] if child is list or child == [] else child
+            node = child[0] if isinstance(child, list) else child
+            if not isinstance(node, dict):
+                raise ValueError(f'schema for {field} conflicts with the spec of {parent}')
+        node[name] = spec
+    return compile_nested(tree)
+
 class XmlReader:
-    def __init__(self, rowtag, source):
-        self.iterator = iterparse(source=source, events=['start', 'end'])
+    def __init__(self, rowtag, source, fields=None, schema=None):
         self.rowtag = rowtag
+        self.fields = None if fields is None else compile_fields(fields)
+        self.convert = None if schema is None else compile_schema(schema)
         self.container = None
         self.path = list()
         self.previous = list()
 
+        if self.fields is None:
+            self.iterator = iterparse(source=source, events=['start', 'end'])
+        else:
+            self.iterator = iterparse(source=source, events=['end'], tag=f'{{*}}{rowtag}')
+
     def length(self):
         return None
 
@@ -15,11 +135,32 @@ class XmlReader:
         while node.getprevious() is not None:
             del node.getparent()[0]
 
+    def release(self, node):
+        node.clear()
+        self.clean(node)
+        for ancestor in node.iterancestors():
+            self.clean(ancestor)
+
     def tick(self, condition):
+        data = self.tick_rows(condition) if self.fields is None else self.tick_projected(condition)
+        return data if data is None or self.convert is None else self.convert(data)
+
+    def tick_projected(self, condition):
+        while condition():
+            try:
+                _, node = next(self.iterator)
+            except StopIteration:
+                return None
+
+            data = build(node, self.fields)
+            self.release(node)
+            return data
+
+    def tick_rows(self, condition):
         while condition():
             try:
                 event, node = next(self.iterator)
-                _, _, tag = node.tag.rpartition('}')
+                tag = local(node)
             except StopIteration:
                 return None
 
@@ -41,18 +182,7 @@ class XmlReader:
                     self.path[-1] = dict()
                 self.previous.append(tag)
                 self.path.append(None)
-            elif self.path[-1] is None:
-                self.path[-2][self.previous[-1]] = node.text
-                self.path.pop()
-                self.previous.pop()
-            elif self.previous[-1] in self.path[-2]:
-                if isinstance(self.path[-2][self.previous[-1]], list):
-                    self.path[-2][self.previous[-1]].append(self.path[-1])
-                else:
-                    self.path[-2][self.previous[-1]] = [self.path[-2][self.previous[-1]], self.path[-1]]
-                self.path.pop()
-                self.previous.pop()
             else:
-                self.path[-2][self.previous[-1]] = self.path[-1]
+                append(self.path[-2], self.previous[-1], node.text if self.path[-1] is None else self.path[-1])
                 self.path.pop()
                 self.previous.pop()
@@ -2,7 +2,7 @@ PREV=$(pwd)
 rm ../tmp/* -f || true
 
 pipenv install --ignore-pipfile --python 3.9
-find . -type f | grep -Ev "v-env|Dockerfile|Makefile|Pipfile|requirements\.txt|\.env|test\.py$" | sort | zip -9 -X -r --quiet $PREV/../tmp/wikipedia-app.zip -@
+find . -type f | grep -Ev "v-env|Dockerfile|Makefile|Pipfile|requirements\.txt|\.env|test\.py$|^\./benchmarks/" | sort | zip -9 -X -r --quiet $PREV/../tmp/wikipedia-app.zip -@
 
 cd $(pipenv --venv)/lib/python3.9/site-packages/
 find . -type f | grep -v "__pycache__" | grep -v ".dist-info/" | sort | zip -9 -X -r --quiet $PREV/../tmp/wikipedia-libs.zip -@
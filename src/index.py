@@ -4,10 +4,20 @@ from os.path import splitext
 from os import getenv
 from queue import Queue
 from re import compile, sub
-from asyncio import get_running_loop, wait, run
-from concurrent.futures import ThreadPoolExecutor
+from asyncio import Queue as AsyncQueue, gather, run
+from traceback import format_exception
 
-from binarian import Pipeline, Singleton, OneToMany, OneToOne, S3Prefix, S3Object, S3List, S3Delete, S3Download, S3Upload, S3Rename, S3Chunk, Ungzip, XmlToJson, Conditional, ForEachChunk, ForEachItem, ForEachItemParallel, S3KeyExists, AcquireToken, ReleaseToken, QuickSort, MergeSort, DataMarker, MergeGroup, MinMax, DictDebug, BinaryDebug, WaitAll, EcsTask, Lambda, FtpDownload, NDJsonChunk, NDJsonIndex, NDJsonFlush, NDJsonMeasure, DictConsumer, BinaryConsumer, Serialize, Deserialize
+from binarian import Pipeline, AsyncPipeline, AsyncConditional, AsyncS3KeyExists, AsyncAcquireToken, AsyncReleaseToken, AsyncEcsTask, Singleton, OneToMany, OneToOne, S3Prefix, S3Object, S3List, S3Delete, S3Download, S3Upload, S3Rename, S3Chunk, Ungzip, XmlToJson, Conditional, ForEachChunk, ForEachItem, ForEachItemParallel, S3KeyExists, AcquireToken, ReleaseToken, QuickSort, MergeSort, DataMarker, MergeGroup, MinMax, DictDebug, BinaryDebug, WaitAll, EcsTask, Lambda, FtpDownload, NDJsonChunk, NDJsonIndex, NDJsonFlush, NDJsonMeasure, DictConsumer, BinaryConsumer, Serialize, Deserialize
+from binarian.engine.common import Metrics
+
+schemas = {
+    'revision': {
+        'id': int,
+        'parentid': int,
+        'minor': bool,
+        'contributor/id': int,
+    }
+}
 
 class Parameters:
     def __init__(self):
@@ -21,14 +31,14 @@ def split_name(name):
     rows.insert(-1, splitext(splitext(sub('[0-9]+', '', rows[-1]))[0])[0])
     return '/'.join(rows)
 
-def master_get(filename, rowtag, bucket, cluster, task, securityGroup, vpcSubnet, ftpQueue, jsonQueue):
-    pipeline = Pipeline(name=filename, steps=[
-        Conditional(
+async def master_get(filename, rowtag, bucket, cluster, task, securityGroup, vpcSubnet, ftpQueue, jsonQueue):
+    pipeline = AsyncPipeline(name=filename, steps=[
+        AsyncConditional(
             inverse=True,
-            condition=S3KeyExists(bucket=bucket, key=lambda value: f'raw/{split_name(value)}'),
+            condition=AsyncS3KeyExists(bucket=bucket, key=lambda value: f'raw/{split_name(value)}'),
             steps=[
-                AcquireToken(queue=ftpQueue),
-                EcsTask(cluster=cluster, task=task, securityGroup=securityGroup, vpcSubnet=vpcSubnet, environment=lambda token: [
+                AsyncAcquireToken(queue=ftpQueue),
+                AsyncEcsTask(cluster=cluster, task=task, securityGroup=securityGroup, vpcSubnet=vpcSubnet, environment=lambda token: [
                     { 'name': 'TYPE', 'value': 'worker-ftp' },
                     { 'name': 'NAME', 'value': token.value },
                     { 'name': 'BUCKET', 'value': bucket },
@@ -37,15 +47,15 @@ def master_get(filename, rowtag, bucket, cluster, task, securityGroup, vpcSubnet
                     { 'name': 'HOST', 'value': token.item['Host'] },
                     { 'name': 'DIRECTORY', 'value': token.item['Directory'] },
                 ]),
-                ReleaseToken(queue=ftpQueue),
+                AsyncReleaseToken(queue=ftpQueue),
             ]
         ), 
-        Conditional(
+        AsyncConditional(
             inverse=True,
-            condition=S3KeyExists(bucket=bucket, key=lambda value: f'json/{split_name(splitext(splitext(value)[0])[0])}.json'),
+            condition=AsyncS3KeyExists(bucket=bucket, key=lambda value: f'json/{split_name(splitext(splitext(value)[0])[0])}.json'),
             steps=[
-                AcquireToken(queue=jsonQueue),
-                EcsTask(cluster=cluster, task=task, securityGroup=securityGroup, vpcSubnet=vpcSubnet, environment=lambda token: [
+                AsyncAcquireToken(queue=jsonQueue),
+                AsyncEcsTask(cluster=cluster, task=task, securityGroup=securityGroup, vpcSubnet=vpcSubnet, environment=lambda token: [
                     { 'name': 'TYPE', 'value': 'worker-json' },
                     { 'name': 'NAME', 'value': token.value },
                     { 'name': 'ROWTAG', 'value': rowtag },
@@ -53,20 +63,20 @@ def master_get(filename, rowtag, bucket, cluster, task, securityGroup, vpcSubnet
                     { 'name': 'INPUT', 'value': f'raw/{split_name(token.value)}' },
                     { 'name': 'OUTPUT', 'value': f'json/{split_name(splitext(splitext(token.value)[0])[0])}.json' },
                 ]),
-                ReleaseToken(queue=jsonQueue),
+                AsyncReleaseToken(queue=jsonQueue),
             ]
         )
     ])
 
-    pipeline.start(input=filename)
+    await pipeline.start(input=filename)
 
-def master_sort(filename, tag, bucket, cluster, task, securityGroup, vpcSubnet):
-    pipeline = Pipeline(name=filename, steps=[
-        Conditional(
+async def master_sort(filename, tag, bucket, cluster, task, securityGroup, vpcSubnet):
+    pipeline = AsyncPipeline(name=filename, steps=[
+        AsyncConditional(
             inverse=True,
-            condition=S3KeyExists(bucket=bucket, key=lambda value: f'sort/{split_name(value)}'),
+            condition=AsyncS3KeyExists(bucket=bucket, key=lambda value: f'sort/{split_name(value)}'),
             steps=[
-                EcsTask(cluster=cluster, task=task, securityGroup=securityGroup, vpcSubnet=vpcSubnet, environment=lambda value: [
+                AsyncEcsTask(cluster=cluster, task=task, securityGroup=securityGroup, vpcSubnet=vpcSubnet, environment=lambda value: [
                     { 'name': 'TYPE', 'value': 'worker-sort' },
                     { 'name': 'NAME', 'value': value },
                     { 'name': 'TAG', 'value': tag },
@@ -78,7 +88,7 @@ def master_sort(filename, tag, bucket, cluster, task, securityGroup, vpcSubnet):
         ), 
     ])
 
-    pipeline.start(input=filename)
+    await pipeline.start(input=filename)
 
 def driver(cluster, task, securityGroup, vpcSubnet):
     pipeline = Pipeline(name='driver', steps=[
@@ -92,24 +102,24 @@ def driver(cluster, task, securityGroup, vpcSubnet):
 def worker_ftp(name, host, directory, bucket, input, output):
     pipeline = Pipeline(name=name, steps=[
         FtpDownload(host=host, directory=directory),
-        S3Upload(bucket=bucket, key=output, chunksize=128*1024*1024)
-    ])
+        S3Upload(bucket=bucket, key=output, chunksize=128*1024*1024, concurrency=4, buffersize=512*1024*1024)
+    ], threaded=True)
 
     pipeline.start(input=input)
 
-def worker_json(name, rowtag, bucket, input, output):
+def worker_json(name, rowtag, bucket, input, output, fields=None):
     pipeline = Pipeline(name=name, steps=[
-        S3Download(),
+        S3Download(concurrency=4, buffersize=128*1024*1024),
         Ungzip(),
-        XmlToJson(rowtag=rowtag),
-        S3Upload(bucket=bucket, key=output, chunksize=128*1024*1024)
-    ])
+        XmlToJson(rowtag=rowtag, fields=fields, schema=schemas.get(rowtag)),
+        S3Upload(bucket=bucket, key=output, chunksize=128*1024*1024, concurrency=4, buffersize=512*1024*1024)
+    ], threaded=True)
 
     pipeline.start(input=S3Object(bucket=bucket, key=input))
 
 def worker_sort(name, tag, bucket, input, output):
     pipeline = Pipeline(name=name, steps=[
-        S3Chunk(chunksize=512*1024*1024),
+        S3Chunk(chunksize=512*1024*1024, delimiter=b'\n'),
         ForEachItemParallel(threads=16, steps=lambda index, metadata: [
             Serialize(),
             Lambda('wikipedia-run', lambda item: {
@@ -183,15 +193,13 @@ if __name__ == '__main__' and getenv('TYPE') == 'worker-ftp':
     worker_ftp(getenv('NAME'), getenv('HOST'), getenv('DIRECTORY'), getenv('BUCKET'), getenv('INPUT'), getenv('OUTPUT'))
 
 if __name__ == '__main__' and getenv('TYPE') == 'worker-json':
-    worker_json(getenv('NAME'), getenv('ROWTAG'), getenv('BUCKET'), getenv('INPUT'), getenv('OUTPUT'))
+    worker_json(getenv('NAME'), getenv('ROWTAG'), getenv('BUCKET'), getenv('INPUT'), getenv('OUTPUT'), getenv('FIELDS').split(',') if getenv('FIELDS') else None)
 
 if __name__ == '__main__' and getenv('TYPE') == 'worker-sort':
     worker_sort(getenv('NAME'), getenv('TAG'), getenv('BUCKET'), getenv('INPUT'), getenv('OUTPUT'))
 
 if __name__ == '__main__' and getenv('TYPE') == 'master':
     parameters = Parameters()
-    ftpQueue = Queue()
-    jsonQueue = Queue()
 
     bucket = parameters.value('/wikipedia/bucket_name')
     securityGroup = parameters.value('/wikipedia/security_group')
@@ -199,36 +207,40 @@ if __name__ == '__main__' and getenv('TYPE') == 'master':
     taskArn = parameters.value('/wikipedia/task_arn')
     clusterArn = parameters.value('/wikipedia/cluster_arn')
 
-    for i in range(15):
-        jsonQueue.put({})
-
-    for i in range(3):
-        ftpQueue.put({
-            'Host': 'ftpmirror.your.org',
-            'Directory': 'pub/wikimedia/dumps/enwiki/20201120/'
-        })
-
-    for i in range(3):
-        ftpQueue.put({
-            'Host': 'ftp.acc.umu.se',
-            'Directory': 'mirror/wikimedia.org/dumps/enwiki/20201120/'
-        })
-
-    for i in range(3):
-        ftpQueue.put({
-            'Host': 'dumps.wikimedia.your.org',
-            'Directory': 'pub/wikimedia/dumps/enwiki/20201120/'
-        })
-
     async def main():
-        tasks = []
-        loop = get_running_loop()
-
-        with ThreadPoolExecutor(max_workers=20) as executor:
-            for item in fetch_names():
-                tasks.append(loop.run_in_executor(executor, master_get, item, 'revision', bucket, clusterArn, taskArn, securityGroup, vpcSubnet, ftpQueue, jsonQueue))
-                #tasks.append(loop.run_in_executor(executor, master_sort, splitext(splitext(item)[0])[0]+'.json', 'title', bucket, clusterArn, taskArn, securityGroup, vpcSubnet))
+        ftpQueue = AsyncQueue()
+        jsonQueue = AsyncQueue()
+
+        for i in range(15):
+            jsonQueue.put_nowait({})
+
+        for i in range(3):
+            ftpQueue.put_nowait({
+                'Host': 'ftpmirror.your.org',
+                'Directory': 'pub/wikimedia/dumps/enwiki/20201120/'
+            })
+
+        for i in range(3):
+            ftpQueue.put_nowait({
+                'Host': 'ftp.acc.umu.se',
+                'Directory': 'mirror/wikimedia.org/dumps/enwiki/20201120/'
+            })
+
+        for i in range(3):
+            ftpQueue.put_nowait({
+                'Host': 'dumps.wikimedia.your.org',
+                'Directory': 'pub/wikimedia/dumps/enwiki/20201120/'
+            })
 
-            await wait(tasks)
+        tasks = []
+        names = fetch_names()
+        for item in names:
+            tasks.append(master_get(item, 'revision', bucket, clusterArn, taskArn, securityGroup, vpcSubnet, ftpQueue, jsonQueue))
+            #tasks.append(master_sort(splitext(splitext(item)[0])[0]+'.json', 'title', bucket, clusterArn, taskArn, securityGroup, vpcSubnet))
+
+        metrics = Metrics('master')
+        for name, result in zip(names, await gather(*tasks, return_exceptions=True)):
+            if isinstance(result, BaseException):
+                metrics.log(f'{name} failed: {"".join(format_exception(type(result), result, result.__traceback__))}')
 
     run(main())
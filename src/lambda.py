@@ -1,16 +1,20 @@
+from os import environ
+
+environ.setdefault('BINARIAN_RANGE_CACHE_DISK', '0')
+
 from binarian import Pipeline, NDJsonMeasure, S3Download, NDJsonChunk, NDJsonIndex, QuickSort, DataMarker, NDJsonFlush, S3Upload, S3Object, OneToOne, Serialize, Deserialize, OneToMany, MergeSort, MinMax, S3Rename, DictDebug
 
 def quick_sort(type, name, bucket, index, tag, input, output):
     pipeline = Pipeline(name=name, steps=[
         Deserialize(),
-        NDJsonMeasure(steps=lambda: [S3Download()]),
-        S3Download(),
+        NDJsonMeasure(cache=True),
+        S3Download(chunksize=16*1024*1024, concurrency=8, cache='read'),
         NDJsonChunk(chunksize=1024*1024),
-        NDJsonIndex(extract=lambda row: int(row[tag])),
-        QuickSort(key=lambda row: row.key),
+        NDJsonIndex(extract=lambda row: int(row[tag]), field=tag, records=True),
+        QuickSort(),
         DataMarker(key='sorting:markers', count=16),
         NDJsonFlush(),
-        S3Upload(bucket=bucket, key=lambda metadata: f'{output}.tmp/{index:04}?{metadata.get("sorting:markers").queryable()}', chunksize=128*1024*1024),
+        S3Upload(bucket=bucket, key=lambda metadata: f'{output}.tmp/{index:04}?{metadata.get("sorting:markers").queryable()}', chunksize=128*1024*1024, spill=True),
         Serialize(),
     ])
 
@@ -22,11 +26,11 @@ def kway_merge(type, name, bucket, index, tag, input, output):
         OneToMany(transform=lambda item: item.split()),
         MergeSort(piecesize=16*1024*1024, key=lambda row: row.key, steps=lambda item: [
             S3Download(),
-            NDJsonIndex(extract=lambda row: int(row[tag])),
+            NDJsonIndex(extract=lambda row: int(row[tag]), field=tag),
         ]),
         MinMax(key='sorting:markers'),
         NDJsonFlush(),
-        S3Upload(bucket=bucket, key=lambda metadata: f'{output}.out/{index:04}', chunksize=128*1024*1024),
+        S3Upload(bucket=bucket, key=lambda metadata: f'{output}.out/{index:04}', chunksize=128*1024*1024, spill=True),
         S3Rename(key=lambda metadata: f'{output}.out/{index:04}?{metadata.get("sorting:markers").queryable()}'),
         Serialize(),
     ])